@@ -4,9 +4,15 @@ import jwt
 from fastapi import Depends, Request
 from fastapi_users import BaseUserManager, UUIDIDMixin, IntegerIDMixin, exceptions, schemas, models
 from fastapi_users.jwt import decode_jwt, generate_jwt
-
-from api.utils.message_utils import send_verify_message, send_reset_message
-from db.models import User
+from sqlalchemy import select, func
+
+from api.auth.strategy import user_cache
+from api.utils.counter_utils import change_counters, apply_counters
+from api.utils.redis_utils import RedisKeys
+from api.utils.upload_utils import discard_upload
+from api.utils.message_utils import send_verify_message, send_reset_message, get_locale
+from db import session
+from db.models import User, Video, UploadSession
 from db.session import get_user_db
 
 SECRET = "SECRET"
@@ -19,6 +25,7 @@ async def get_user_manager(user_db=Depends(get_user_db)):
 class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
     reset_password_token_secret = SECRET
     verification_token_secret = SECRET
+    deleted_counters: dict[str, int] = {}
 
     async def forgot_password(
             self, user: models.UP, request: Optional[Request] = None
@@ -105,12 +112,43 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
     async def on_after_register(self, user: User, request: Optional[Request] = None):
         pass
 
+    async def on_after_update(self, user: User, update_dict: dict, request: Optional[Request] = None):
+        await user_cache.invalidate(user.id)
+
+    async def on_after_verify(self, user: User, request: Optional[Request] = None):
+        await user_cache.invalidate(user.id)
+
+    async def on_after_reset_password(self, user: User, request: Optional[Request] = None):
+        await user_cache.invalidate(user.id)
+
+    async def on_before_delete(self, user: User, request: Optional[Request] = None):
+        """Take the user's videos, which the delete cascades to, out of the counters in the same transaction,
+        and abort their open uploads so the parts do not stay in storage."""
+        db = self.user_db.session
+        total, public = (await db.execute(select(func.count(), func.count().filter(~Video.is_private))
+                                          .where(Video.owner_id == user.id))).one()
+        self.deleted_counters = {RedisKeys.owner_videos_count(user.id): -total,
+                                 RedisKeys.public_videos_count(): -public}
+        for name, delta in self.deleted_counters.items():
+            await change_counters(db, [name], delta)
+        uploads = (await db.execute(select(UploadSession).where(UploadSession.owner_id == user.id)
+                                    .with_for_update())).scalars().all()
+        for upload in uploads:
+            await discard_upload(upload)
+            await db.delete(upload)
+
+    async def on_after_delete(self, user: User, request: Optional[Request] = None):
+        await user_cache.invalidate(user.id)
+        if session.redis_session is not None:
+            for name, delta in self.deleted_counters.items():
+                await apply_counters(session.redis_session, [name], delta)
+
     async def on_after_forgot_password(
             self, user: User, token: str, request: Optional[Request] = None
     ):
-        send_reset_message(token, user.email)
+        send_reset_message(token, user.email, get_locale(request))
 
     async def on_after_request_verify(
             self, user: User, token: str, request: Optional[Request] = None
     ):
-        send_verify_message(token, user.email)
+        send_verify_message(token, user.email, get_locale(request))
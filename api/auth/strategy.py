@@ -1,14 +1,112 @@
+import datetime
+import json
+import uuid
+from typing import Optional
+
+import jwt
+from fastapi_users import exceptions
 from fastapi_users.authentication import  AuthenticationBackend, BearerTransport
 
 from fastapi_users.authentication import JWTStrategy
+from fastapi_users.jwt import decode_jwt
+from sqlalchemy.orm import make_transient_to_detached
 
 import config
+from api.utils.cache_utils import LRUCache
+from api.utils.redis_utils import RedisKeys
+from db import session
+from db.models import User
 
 bearer_transport = BearerTransport(tokenUrl="/api/v1/auth/login")
 
+USER_FIELDS = ("id", "email", "hashed_password", "is_active", "is_superuser", "is_verified", "username", "url_photo",
+               "register_date")
+# the password hash stays in process memory; the shared Redis tier never holds credentials
+REDIS_USER_FIELDS = tuple(field for field in USER_FIELDS if field != "hashed_password")
+
+
+class UserCache:
+    """Authenticated users by id: a short-TTL local LRU, optionally backed by Redis.
+
+    Entries are column dicts; every hit builds a new detached User so requests never share an
+    instance between sessions. Users read from Redis have no hashed_password loaded, so touching it
+    raises instead of returning a stale or empty hash. UserManager invalidates on update, verify,
+    reset and delete.
+    """
+
+    def __init__(self, local: LRUCache, use_redis: bool):
+        self.local = local
+        self.use_redis = use_redis
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, user_id: str) -> Optional[User]:
+        data = self.local.get(user_id)
+        if data is None and self.use_redis and session.redis_session is not None:
+            raw = await session.redis_session.get(RedisKeys.user_auth(user_id))
+            if raw is not None:
+                data = json.loads(raw)
+                data["id"] = uuid.UUID(data["id"])
+                data["register_date"] = datetime.datetime.fromisoformat(data["register_date"])
+                self.local.set(user_id, data)
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        user = User(**data)
+        make_transient_to_detached(user)
+        return user
+
+    async def set(self, user: User) -> None:
+        data = {field: getattr(user, field) for field in USER_FIELDS}
+        self.local.set(str(user.id), data)
+        if self.use_redis and session.redis_session is not None:
+            await session.redis_session.set(RedisKeys.user_auth(user.id),
+                                            json.dumps({**{field: data[field] for field in REDIS_USER_FIELDS},
+                                                        "id": str(user.id),
+                                                        "register_date": user.register_date.isoformat()}),
+                                            ex=int(self.local.ttl))
+
+    async def invalidate(self, user_id: uuid.UUID) -> None:
+        self.local.delete(str(user_id))
+        if self.use_redis and session.redis_session is not None:
+            await session.redis_session.delete(RedisKeys.user_auth(user_id))
+
+    def stats(self) -> dict:
+        return {"local_size": len(self.local.data), "hits": self.hits, "misses": self.misses}
+
+
+user_cache = UserCache(LRUCache(config.USER_CACHE_SIZE, config.USER_CACHE_TTL), config.USER_CACHE_REDIS)
+
+
+class CachedJWTStrategy(JWTStrategy):
+    """JWTStrategy that looks the token's `sub` up in user_cache before loading the user row."""
+
+    async def read_token(self, token, user_manager):
+        if token is None:
+            return None
+
+        try:
+            data = decode_jwt(token, self.decode_key, self.token_audience, algorithms=[self.algorithm])
+            user_id = data.get("sub")
+            if user_id is None:
+                return None
+        except jwt.PyJWTError:
+            return None
+
+        user = await user_cache.get(user_id)
+        if user is not None:
+            return user
+        try:
+            user = await user_manager.get(user_manager.parse_id(user_id))
+        except (exceptions.UserNotExists, exceptions.InvalidID):
+            return None
+        await user_cache.set(user)
+        return user
+
 
 def get_jwt_strategy() -> JWTStrategy:
-    return JWTStrategy(secret=config.SECRET, lifetime_seconds=7200)
+    return CachedJWTStrategy(secret=config.SECRET, lifetime_seconds=7200)
 
 
 auth_backend = AuthenticationBackend(
@@ -1,13 +1,19 @@
+import typing
 import uuid
 
+import redis
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.auth.routers import fastapi_users
-from api.comments.schemes import CreateComment, CommentRead
-from db.models import Comment, User, Video
-from db.session import get_async_session
+from api.comments.schemes import CreateComment, CommentRead, CommentList, CommentReactions
+from api.common.schemes import pagination_params, paginate, next_cursor
+from api.utils.cache_utils import video_cache
+from api.utils.comment_utils import count_reactions, get_top_comments, toggle_comment_like, toggle_comment_dislike
+from api.utils.redis_utils import RedisKeys
+from db.models import Comment, User
+from db.session import get_async_session, get_redis_async_session
 
 comments_api = APIRouter(
     prefix="/comments",
@@ -17,30 +23,90 @@ comments_api = APIRouter(
 
 @comments_api.get("/for_video/{video_id}")
 async def get_comments(video_id: uuid.UUID,
-                       db: AsyncSession = Depends(get_async_session)) -> list[CommentRead]:
-    return [await comment_to_commentRead(comment, db)
-            for comment in (await db.execute(select(Comment).where(Comment.video_id == video_id))).scalars().all()]
+                       sort: typing.Literal["new", "top"] = "new",
+                       page_params: dict = Depends(pagination_params),
+                       db: AsyncSession = Depends(get_async_session),
+                       red: redis.Redis = Depends(get_redis_async_session)) -> CommentList:
+    if sort == "top":
+        return await get_top_comment_list(video_id, page_params, db, red)
+    rows = (await db.execute(paginate(select(Comment, User.username)
+                                      .join(User, User.id == Comment.user_id)
+                                      .where(Comment.video_id == video_id),
+                                      page_params, Comment.published_date, Comment.id))).all()
+    return CommentList(comments=await build_comment_reads(rows, red),
+                       next_cursor=next_cursor([comment for comment, _ in rows], page_params))
+
+
+async def get_top_comment_list(video_id: uuid.UUID, page_params: dict,
+                               db: AsyncSession, red: redis.Redis) -> CommentList:
+    """Comments ordered by likes - dislikes, read page by page from the video's comment score set."""
+    ids, total = await get_top_comments(red, video_id, page_params["offset"], page_params["limit"])
+    if not ids:
+        return CommentList(comments=[])
+    order = {comment_id: i for i, comment_id in enumerate(ids)}
+    rows = sorted((await db.execute(select(Comment, User.username)
+                                    .join(User, User.id == Comment.user_id)
+                                    .where(Comment.id.in_(ids)))).all(),
+                  key=lambda row: order[str(row[0].id)])
+    end = page_params["offset"] + len(ids)
+    return CommentList(comments=await build_comment_reads(rows, red),
+                       next_offset=end if end < total else None)
+
+
+@comments_api.post("/{comment_id}/like")
+async def like_comment(comment_id: uuid.UUID,
+                       user: User = Depends(fastapi_users.current_user(active=True)),
+                       db: AsyncSession = Depends(get_async_session),
+                       red: redis.Redis = Depends(get_redis_async_session)) -> CommentReactions:
+    video_id = await get_comment_video_id(comment_id, db)
+    likes, dislikes = await toggle_comment_like(red, comment_id, video_id, user.id)
+    return CommentReactions(likes=likes, dislikes=dislikes)
+
+
+@comments_api.post("/{comment_id}/dislike")
+async def dislike_comment(comment_id: uuid.UUID,
+                          user: User = Depends(fastapi_users.current_user(active=True)),
+                          db: AsyncSession = Depends(get_async_session),
+                          red: redis.Redis = Depends(get_redis_async_session)) -> CommentReactions:
+    video_id = await get_comment_video_id(comment_id, db)
+    likes, dislikes = await toggle_comment_dislike(red, comment_id, video_id, user.id)
+    return CommentReactions(likes=likes, dislikes=dislikes)
+
+
+async def get_comment_video_id(comment_id: uuid.UUID, db: AsyncSession) -> uuid.UUID:
+    video_id = (await db.execute(select(Comment.video_id).where(Comment.id == comment_id))).scalar()
+    if video_id is None:
+        raise HTTPException(404)
+    return video_id
 
 
 @comments_api.post("/{video_id}", status_code=201)
 async def add_comment(video_id: uuid.UUID,
                       comment: CreateComment,
                       user: User = Depends(fastapi_users.current_user(active=True, verified=True)),
-                      db: AsyncSession = Depends(get_async_session)):
-    flag = (await db.execute(select(Video.id).where(Video.id == video_id))).scalar()
-    if flag is None:
+                      db: AsyncSession = Depends(get_async_session),
+                      red: redis.Redis = Depends(get_redis_async_session)):
+    if await video_cache.get(video_id, db, red) is None:
         raise HTTPException(404)
 
-    db.add(Comment(user_id=user.id, video_id=video_id, text=comment.text))
+    new_comment = Comment(user_id=user.id, video_id=video_id, text=comment.text)
+    db.add(new_comment)
     await db.commit()
+    await red.zadd(RedisKeys.video_comment_scores(video_id), {str(new_comment.id): 0}, nx=True)
+
 
+async def build_comment_reads(rows: typing.Sequence, red: redis.Redis) -> list[CommentRead]:
+    reactions = await count_reactions(red, [comment.id for comment, _ in rows])
+    return [build_comment_read(comment, username, likes, dislikes)
+            for (comment, username), (likes, dislikes) in zip(rows, reactions)]
 
-async def comment_to_commentRead(comment: Comment, db:AsyncSession) -> CommentRead:
-    username = (await db.execute(select(User.username).where(User.id == comment.user_id))).scalar()
 
+def build_comment_read(comment: Comment, username: str, likes: int = 0, dislikes: int = 0) -> CommentRead:
     return CommentRead(id=comment.id,
                        text=comment.text,
                        video_id=comment.video_id,
                        user_id=comment.user_id,
                        published_date=comment.published_date,
-                       username=username)
+                       username=username,
+                       likes=likes,
+                       dislikes=dislikes)
@@ -1,5 +1,6 @@
 import uuid
 from datetime import datetime
+from typing import Optional
 
 from pydantic import BaseModel
 
@@ -11,6 +12,19 @@ class CommentRead(BaseModel):
     text: str
     published_date: datetime
     username:str
+    likes: int = 0
+    dislikes: int = 0
 
 class CreateComment(BaseModel):
     text: str
+
+
+class CommentReactions(BaseModel):
+    likes: int
+    dislikes: int
+
+
+class CommentList(BaseModel):
+    comments: list[CommentRead]
+    next_cursor: Optional[str] = None
+    next_offset: Optional[int] = None
@@ -1,2 +1,40 @@
-def pagination_params(offset: int = 0, limit: int = 15) -> dict:
-    return {"offset": offset, "limit": limit}
+import base64
+import binascii
+import datetime
+import uuid
+from typing import Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import Select, tuple_
+
+
+def pagination_params(offset: int = 0, limit: int = 15, cursor: Optional[str] = None) -> dict:
+    return {"offset": offset, "limit": limit, "cursor": cursor}
+
+
+def encode_cursor(published_date: datetime.datetime, _id: uuid.UUID) -> str:
+    raw = f"{published_date.isoformat()}|{_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, uuid.UUID]:
+    try:
+        published_date, _id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.datetime.fromisoformat(published_date), uuid.UUID(_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail={"message": "invalid cursor"})
+
+
+def paginate(query: Select, page_params: dict, published_date, _id) -> Select:
+    """Order by (published_date, id) newest first and apply either the cursor or offset/limit."""
+    query = query.order_by(published_date.desc(), _id.desc()).limit(page_params["limit"])
+    if page_params["cursor"] is None:
+        return query.offset(page_params["offset"])
+    cursor_date, cursor_id = decode_cursor(page_params["cursor"])
+    return query.where(tuple_(published_date, _id) < tuple_(cursor_date, cursor_id))
+
+
+def next_cursor(rows: Sequence, page_params: dict) -> Optional[str]:
+    if not rows or len(rows) < page_params["limit"]:
+        return None
+    return encode_cursor(rows[-1].published_date, rows[-1].id)
@@ -0,0 +1,38 @@
+import time
+
+from starlette.types import ASGIApp, Scope, Receive, Send, Message
+
+from api.metrics.stats import RequestStats, request_stats, observe_request
+
+
+class MetricsMiddleware:
+    """Times each request and counts the database queries and Redis round trips made while serving it."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            request_stats.reset(token)
+            # the router stores the matched route in the scope; label by its template, not the raw path
+            route = scope.get("route")
+            observe_request(scope["method"], route.path if route is not None else "unmatched", status, elapsed,
+                            stats)
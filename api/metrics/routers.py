@@ -0,0 +1,69 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+
+from api.auth.strategy import user_cache
+from api.metrics.stats import POOL_GAUGE
+from api.utils.cache_utils import video_cache, feed_cache
+from api.utils.message_utils import mail_queue
+from api.utils.s3_utils import s3_stats
+from api.utils.view_utils import view_buffer
+from db import session
+
+metrics_api = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"]
+)
+
+
+@metrics_api.get("")
+async def prometheus_metrics() -> Response:
+    """Prometheus exposition of request metrics plus the current pool state."""
+    if session.redis_pool is not None:
+        for state, value in session.redis_pool.stats().items():
+            POOL_GAUGE.labels("redis", state).set(value)
+    for state, value in session.engine.pool.stats().items():
+        POOL_GAUGE.labels("db", state).set(value)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@metrics_api.get("/redis")
+async def redis_pool_metrics() -> dict:
+    if session.redis_pool is None:
+        return {}
+    return session.redis_pool.stats()
+
+
+@metrics_api.get("/db")
+async def db_pool_metrics() -> dict:
+    return session.engine.pool.stats()
+
+
+@metrics_api.get("/views")
+async def view_buffer_metrics() -> dict:
+    return view_buffer.stats()
+
+
+@metrics_api.get("/cache")
+async def video_cache_metrics() -> dict:
+    return video_cache.stats()
+
+
+@metrics_api.get("/feed")
+async def feed_cache_metrics() -> dict:
+    return feed_cache.stats()
+
+
+@metrics_api.get("/s3")
+async def s3_metrics() -> dict:
+    return s3_stats()
+
+
+@metrics_api.get("/mail")
+async def mail_queue_metrics() -> dict:
+    return mail_queue.stats()
+
+
+@metrics_api.get("/users")
+async def user_cache_metrics() -> dict:
+    return user_cache.stats()
@@ -0,0 +1,76 @@
+import logging
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import Histogram, Counter, Gauge
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from config import REQUEST_CALLS_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1, 2.5, 5, 10)
+CALL_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency", ["method", "route", "status"],
+                            buckets=LATENCY_BUCKETS)
+REQUEST_DB_QUERIES = Histogram("http_request_db_queries", "Database queries per request", ["route"],
+                               buckets=CALL_BUCKETS)
+REQUEST_DB_TIME = Histogram("http_request_db_seconds", "Time spent in database queries per request", ["route"],
+                            buckets=LATENCY_BUCKETS)
+REQUEST_REDIS_CALLS = Histogram("http_request_redis_calls", "Redis round trips per request", ["route"],
+                                buckets=CALL_BUCKETS)
+REQUEST_REDIS_TIME = Histogram("http_request_redis_seconds", "Time spent in Redis round trips per request", ["route"],
+                               buckets=LATENCY_BUCKETS)
+CHATTY_REQUESTS = Counter("http_requests_over_call_threshold", "Requests whose backend calls exceeded the threshold",
+                          ["route"])
+POOL_GAUGE = Gauge("connection_pool", "Connection pool state", ["pool", "state"])
+
+
+class RequestStats:
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.redis_calls = 0
+        self.redis_time = 0.0
+
+
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def record_redis_call(elapsed: float) -> None:
+    stats = request_stats.get()
+    if stats is not None:
+        stats.redis_calls += 1
+        stats.redis_time += elapsed
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = request_stats.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_time += elapsed
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", after_cursor_execute)
+
+
+def observe_request(method: str, route: str, status: int, elapsed: float, stats: RequestStats) -> None:
+    REQUEST_LATENCY.labels(method, route, status).observe(elapsed)
+    REQUEST_DB_QUERIES.labels(route).observe(stats.db_queries)
+    REQUEST_DB_TIME.labels(route).observe(stats.db_time)
+    REQUEST_REDIS_CALLS.labels(route).observe(stats.redis_calls)
+    REQUEST_REDIS_TIME.labels(route).observe(stats.redis_time)
+    if stats.db_queries + stats.redis_calls > REQUEST_CALLS_THRESHOLD:
+        CHATTY_REQUESTS.labels(route).inc()
+        logger.warning("%s %s made %d db queries (%.1f ms) and %d redis calls (%.1f ms)", method, route,
+                       stats.db_queries, stats.db_time * 1000, stats.redis_calls, stats.redis_time * 1000)
@@ -0,0 +1,243 @@
+import base64
+import hashlib
+import uuid
+
+import redis
+from botocore.exceptions import ClientError
+from fastapi import APIRouter, Depends, HTTPException, Request, Path
+from fastapi.params import Header
+from pydantic import Required
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+
+from api.auth.routers import fastapi_users
+from api.uploads.schemes import UploadCreate, UploadRead, DirectUploadRead
+from api.utils.redis_utils import RedisKeys
+from api.utils.s3_utils import get_key, get_url_to_obj, create_multipart_upload, upload_part, list_parts, \
+    complete_multipart_upload, presign_put, head_object, copy_object, delete_object
+from api.utils.upload_utils import discard_upload, STAGING_PREFIX
+from api.videos.routers import MAX_FILE_SIZE, save_video
+from api.videos.schemes import VideoModel
+from config import S3_PART_SIZE, UPLOAD_SESSION_TTL, PRESIGNED_URL_TTL
+from db.models import User, UploadSession
+from db.session import get_async_session, get_redis_async_session
+
+uploads_api = APIRouter(
+    prefix="/uploads",
+    tags=["Uploads"]
+)
+
+MAX_PART_NUMBER = 10000
+
+
+@uploads_api.post("/", status_code=status.HTTP_201_CREATED)
+async def create_upload(upload: UploadCreate,
+                        user: User = Depends(fastapi_users.current_user(active=True, verified=True)),
+                        db: AsyncSession = Depends(get_async_session)) -> UploadRead:
+    check_video_file(upload.content_type, upload.size)
+    if part_count(upload.size) > MAX_PART_NUMBER:
+        raise HTTPException(status_code=413, detail={"message": f"at most {MAX_PART_NUMBER} parts"})
+
+    key = get_key(upload.filename, "videos/")
+    session = UploadSession(owner_id=user.id, name=upload.filename, key=key, size=upload.size,
+                            s3_upload_id=await create_multipart_upload(key))
+    db.add(session)
+    await db.commit()
+    return UploadRead(id=session.id, size=session.size, part_size=S3_PART_SIZE, parts=[])
+
+
+@uploads_api.get("/{upload_id}")
+async def get_upload(upload_id: uuid.UUID,
+                     user: User = Depends(fastapi_users.current_user(active=True, verified=True)),
+                     db: AsyncSession = Depends(get_async_session)) -> UploadRead:
+    session = await get_upload_session(upload_id, user, db)
+    parts = await get_stored_parts(session)
+    return UploadRead(id=session.id, size=session.size, part_size=S3_PART_SIZE,
+                      parts=[part["PartNumber"] for part in parts])
+
+
+@uploads_api.put("/{upload_id}/parts/{part_number}", status_code=204)
+async def put_part(request: Request,
+                   upload_id: uuid.UUID,
+                   part_number: int = Path(ge=1, le=MAX_PART_NUMBER),
+                   content_md5: str = Header(Required),
+                   user: User = Depends(fastapi_users.current_user(active=True, verified=True)),
+                   db: AsyncSession = Depends(get_async_session)):
+    """Every part but the last must be exactly part_size bytes; the last one holds the remainder."""
+    content_length = request.headers.get("Content-Length")
+    if content_length is None:
+        raise HTTPException(status_code=411, detail={"message": "Content-Length is required"})
+    session = await get_upload_session(upload_id, user, db)
+    size = part_size(session.size, part_number)
+    if int(content_length) != size:
+        raise HTTPException(status_code=400, detail={"message": f"part {part_number} must be {size} bytes"})
+
+    body = await read_part(request, size)
+    if base64.b64encode(hashlib.md5(body).digest()).decode() != content_md5:
+        raise HTTPException(status_code=400, detail={"message": "checksum mismatch"})
+    try:
+        await upload_part(session.key, session.s3_upload_id, part_number, body, content_md5)
+    except ClientError as ex:
+        code = ex.response["Error"]["Code"]
+        if code in ("BadDigest", "InvalidDigest"):
+            raise HTTPException(status_code=400, detail={"message": "checksum mismatch"})
+        if code == "NoSuchUpload":
+            raise HTTPException(status_code=409, detail={"message": "upload is already completed or aborted"})
+        raise
+
+
+@uploads_api.post("/{upload_id}/complete", status_code=status.HTTP_201_CREATED)
+async def complete_upload(upload_id: uuid.UUID,
+                          user: User = Depends(fastapi_users.current_user(active=True, verified=True)),
+                          db: AsyncSession = Depends(get_async_session),
+                          red: redis.Redis = Depends(get_redis_async_session)) -> VideoModel:
+    # the row lock makes concurrent completes wait; the loser then finds the session gone
+    session = await get_upload_session(upload_id, user, db, lock=True)
+    try:
+        parts = await list_parts(session.key, session.s3_upload_id)
+    except ClientError as ex:
+        if ex.response["Error"]["Code"] != "NoSuchUpload":
+            raise
+        parts = None
+
+    if parts is None:
+        # S3 completed it on an earlier call whose video insert failed; finish that call's work
+        head = await head_object(session.key)
+        if head is None or head["ContentLength"] != session.size:
+            raise HTTPException(status_code=409, detail={"message": "upload is aborted"})
+    else:
+        numbers = [part["PartNumber"] for part in parts]
+        if numbers != list(range(1, part_count(session.size) + 1)):
+            raise HTTPException(status_code=409, detail={"message": "missing parts", "parts": numbers})
+        if sum(part["Size"] for part in parts) != session.size:
+            raise HTTPException(status_code=409, detail={"message": "uploaded size does not match"})
+        try:
+            await complete_multipart_upload(session.key, session.s3_upload_id,
+                                            [{"PartNumber": part["PartNumber"], "ETag": part["ETag"]}
+                                             for part in parts])
+        except ClientError as ex:
+            code = ex.response["Error"]["Code"]
+            if code == "NoSuchUpload":
+                raise HTTPException(status_code=409, detail={"message": "upload is already completed or aborted"})
+            if code in ("EntityTooSmall", "InvalidPart", "InvalidPartOrder"):
+                raise HTTPException(status_code=400, detail={"message": ex.response["Error"]["Message"]})
+            raise
+
+    await db.delete(session)
+    # the session row goes away in the same commit that saves the video
+    return await save_video(get_url_to_obj(session.key), session.name, user, db, red)
+
+
+@uploads_api.delete("/{upload_id}", status_code=204)
+async def abort_upload(upload_id: uuid.UUID,
+                       user: User = Depends(fastapi_users.current_user(active=True, verified=True)),
+                       db: AsyncSession = Depends(get_async_session)):
+    session = await get_upload_session(upload_id, user, db, lock=True)
+    await discard_upload(session)
+    await db.delete(session)
+    await db.commit()
+
+
+@uploads_api.post("/direct", status_code=status.HTTP_201_CREATED)
+async def create_direct_upload(upload: UploadCreate,
+                               user: User = Depends(fastapi_users.current_user(active=True, verified=True)),
+                               red: redis.Redis = Depends(get_redis_async_session)) -> DirectUploadRead:
+    check_video_file(upload.content_type, upload.size)
+
+    upload_id = uuid.uuid4()
+    key = get_key(upload.filename, STAGING_PREFIX)
+    url = await presign_put(key, upload.content_type, PRESIGNED_URL_TTL)
+    await red.hset(RedisKeys.direct_upload(upload_id), mapping={"owner_id": str(user.id), "key": key,
+                                                                  "name": upload.filename})
+    await red.expire(RedisKeys.direct_upload(upload_id), UPLOAD_SESSION_TTL)
+    return DirectUploadRead(id=upload_id, url=url, headers={"Content-Type": upload.content_type},
+                            expires_in=PRESIGNED_URL_TTL)
+
+
+@uploads_api.post("/direct/{upload_id}/complete", status_code=status.HTTP_201_CREATED)
+async def complete_direct_upload(upload_id: uuid.UUID,
+                                 user: User = Depends(fastapi_users.current_user(active=True, verified=True)),
+                                 db: AsyncSession = Depends(get_async_session),
+                                 red: redis.Redis = Depends(get_redis_async_session)) -> VideoModel:
+    upload = await red.hgetall(RedisKeys.direct_upload(upload_id))
+    if not upload:
+        raise HTTPException(404)
+    if upload["owner_id"] != str(user.id):
+        raise HTTPException(403)
+
+    head = await head_object(upload["key"])
+    if head is None:
+        raise HTTPException(status_code=409, detail={"message": "file is not uploaded yet"})
+    # only one finalize call may create the video
+    if not await red.delete(RedisKeys.direct_upload(upload_id)):
+        raise HTTPException(404)
+    # the presigned URL stays valid after finalize, so the checked bytes are copied to a key the client
+    # cannot write to; the ETag condition makes the copy fail if they were replaced after the HEAD
+    key = get_key(upload["name"], "videos/")
+    try:
+        check_video_file(head.get("ContentType", ""), head["ContentLength"])
+        await copy_object(upload["key"], key, head["ETag"])
+    except ClientError as ex:
+        if ex.response["Error"]["Code"] == "PreconditionFailed":
+            raise HTTPException(status_code=409, detail={"message": "file changed during upload"})
+        raise
+    finally:
+        await delete_object(upload["key"])
+    try:
+        return await save_video(get_url_to_obj(key), upload["name"], user, db, red)
+    except BaseException:
+        await delete_object(key)
+        raise
+
+
+def check_video_file(content_type: str, size: int) -> None:
+    if content_type.split("/")[-1] not in ["mp4"]:
+        raise HTTPException(status_code=415, detail={"message": " supported: mp4"})
+    if size > MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail={"message": f"max size is {MAX_FILE_SIZE}"})
+
+
+async def get_upload_session(upload_id: uuid.UUID, user: User, db: AsyncSession,
+                             lock: bool = False) -> UploadSession:
+    query = select(UploadSession).where(UploadSession.id == upload_id)
+    if lock:
+        query = query.with_for_update()
+    session = (await db.execute(query)).scalar()
+    if session is None:
+        raise HTTPException(404)
+    if session.owner_id != user.id:
+        raise HTTPException(403)
+    return session
+
+
+async def get_stored_parts(session: UploadSession) -> list[dict]:
+    try:
+        return await list_parts(session.key, session.s3_upload_id)
+    except ClientError as ex:
+        if ex.response["Error"]["Code"] == "NoSuchUpload":
+            raise HTTPException(status_code=409, detail={"message": "upload is already completed or aborted"})
+        raise
+
+
+def part_count(size: int) -> int:
+    return -(-size // S3_PART_SIZE)
+
+
+def part_size(size: int, part_number: int) -> int:
+    count = part_count(size)
+    if part_number > count:
+        raise HTTPException(status_code=400, detail={"message": f"upload has only {count} parts"})
+    if part_number < count:
+        return S3_PART_SIZE
+    return size - (count - 1) * S3_PART_SIZE
+
+
+async def read_part(request: Request, size: int) -> bytes:
+    """Read the body, refusing it as soon as it grows past the expected part size."""
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > size:
+            raise HTTPException(status_code=413, detail={"message": f"part must be {size} bytes"})
+    return bytes(body)
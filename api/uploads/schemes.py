@@ -0,0 +1,23 @@
+import uuid
+
+from pydantic import BaseModel, Field
+
+
+class UploadCreate(BaseModel):
+    filename: str
+    content_type: str
+    size: int = Field(gt=0)
+
+
+class UploadRead(BaseModel):
+    id: uuid.UUID
+    size: int
+    part_size: int
+    parts: list[int]
+
+
+class DirectUploadRead(BaseModel):
+    id: uuid.UUID
+    url: str
+    headers: dict[str, str]
+    expires_in: int
@@ -0,0 +1,194 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional, Any, Callable, Awaitable
+
+import redis
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.utils.redis_utils import RedisKeys, RELEASE_LOCK, INVALIDATE_CACHE, FILL_IF_CURRENT
+from config import VIDEO_CACHE_SIZE, VIDEO_CACHE_LOCAL_TTL, VIDEO_CACHE_TTL, FEED_CACHE_TTL, FEED_CACHE_LOCK_TTL, \
+    FEED_CACHE_WAIT
+from db.models import Video
+
+
+class LRUCache:
+    """In-process LRU whose entries also expire after ttl seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key) -> Optional[Any]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self.data[key]
+            return None
+        self.data.move_to_end(key)
+        return value
+
+    def set(self, key, value) -> None:
+        self.data[key] = (time.monotonic() + self.ttl, value)
+        self.data.move_to_end(key)
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def delete(self, key) -> None:
+        self.data.pop(key, None)
+
+
+VIDEO_FIELDS = ("id", "name", "url_video", "description", "is_private", "preview", "previews", "published_date",
+                "owner_id")
+
+
+def dump_video(video: Video) -> dict:
+    return {field: getattr(video, field) for field in VIDEO_FIELDS}
+
+
+def serialize_video(data: dict) -> str:
+    return json.dumps({**data,
+                       "id": str(data["id"]),
+                       "owner_id": str(data["owner_id"]),
+                       "published_date": data["published_date"].isoformat()})
+
+
+def deserialize_video(raw: str) -> dict:
+    data = json.loads(raw)
+    data["id"] = uuid.UUID(data["id"])
+    data["owner_id"] = uuid.UUID(data["owner_id"])
+    data["published_date"] = datetime.datetime.fromisoformat(data["published_date"])
+    return data
+
+
+class VideoCache:
+    """Video rows by primary key: a short-lived local LRU in front of a shared Redis copy.
+
+    Invalidation only reaches the local tier of the current worker, so the local ttl bounds
+    how long other workers may serve a stale row.
+    """
+
+    def __init__(self, local: LRUCache, redis_ttl: int):
+        self.local = local
+        self.redis_ttl = redis_ttl
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    async def get(self, video_id: uuid.UUID, db: AsyncSession, red: redis.Redis) -> Optional[Video]:
+        data = self.local.get(video_id)
+        if data is not None:
+            self.local_hits += 1
+            return Video(**data)
+
+        key = RedisKeys.video_meta(video_id)
+        raw, version = await red.mget(key, RedisKeys.cache_version(key))
+        if raw is not None:
+            self.redis_hits += 1
+            data = deserialize_video(raw)
+            self.local.set(video_id, data)
+            return Video(**data)
+
+        self.misses += 1
+        video = (await db.execute(select(Video).where(Video.id == video_id))).scalar()
+        if video is None:
+            return None
+        data = dump_video(video)
+        # a row read before a concurrent update committed must not outlive its invalidate
+        if await FILL_IF_CURRENT(red, [key, RedisKeys.cache_version(key)],
+                                 [serialize_video(data), version or "", self.redis_ttl]):
+            self.local.set(video_id, data)
+        return video
+
+    async def invalidate(self, video_id: uuid.UUID, red: redis.Redis) -> None:
+        self.local.delete(video_id)
+        key = RedisKeys.video_meta(video_id)
+        await INVALIDATE_CACHE(red, [key, RedisKeys.cache_version(key)], [self.redis_ttl])
+
+    def stats(self) -> dict:
+        return {"local_size": len(self.local.data),
+                "local_hits": self.local_hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses}
+
+
+class PageCache:
+    """Rendered response bodies shared between workers for a few seconds.
+
+    On a miss only the worker that takes the rebuild lock builds the page; the others poll for its
+    result for up to wait seconds and build it themselves only if it never shows up.
+    """
+
+    poll_interval = 0.05
+
+    def __init__(self, ttl: int, lock_ttl: int, wait: float):
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.wait = wait
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, page_key: str, red: redis.Redis, build: Callable[[], Awaitable[str]]) -> str:
+        key = RedisKeys.feed_page(page_key)
+        body = await red.get(key)
+        if body is not None:
+            self.hits += 1
+            return body
+
+        lock = RedisKeys.feed_page_lock(page_key)
+        token = uuid.uuid4().hex
+        if not await red.set(lock, token, nx=True, ex=self.lock_ttl):
+            for _ in range(int(self.wait / self.poll_interval)):
+                await asyncio.sleep(self.poll_interval)
+                body = await red.get(key)
+                if body is not None:
+                    self.coalesced += 1
+                    return body
+            token = None
+
+        self.misses += 1
+        try:
+            body = await build()
+            await red.set(key, body, ex=self.ttl)
+        finally:
+            if token is not None:
+                await RELEASE_LOCK(red, [lock], [token])
+        return body
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "coalesced": self.coalesced, "misses": self.misses}
+
+
+def make_etag(body: str) -> str:
+    return f'"{hashlib.sha1(body.encode()).hexdigest()}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("If-None-Match")
+    if header is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def etag_response(request: Request, body: str, cache_control: str = "no-cache") -> Response:
+    """JSON response tagged with the hash of its body, or an empty 304 when the client already has it."""
+    etag = make_etag(body)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+video_cache = VideoCache(LRUCache(VIDEO_CACHE_SIZE, VIDEO_CACHE_LOCAL_TTL), VIDEO_CACHE_TTL)
+feed_cache = PageCache(FEED_CACHE_TTL, FEED_CACHE_LOCK_TTL, FEED_CACHE_WAIT)
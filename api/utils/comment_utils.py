@@ -0,0 +1,54 @@
+import typing
+import uuid
+
+import redis
+
+from api.utils.redis_utils import RedisKeys, TOGGLE_COMMENT_LIKE, TOGGLE_COMMENT_DISLIKE
+
+
+def comment_script_keys(comment_id: uuid.UUID, video_id: uuid.UUID) -> list[str]:
+    return [RedisKeys.comment_likes(comment_id), RedisKeys.comment_dislikes(comment_id),
+            RedisKeys.video_comment_scores(video_id)]
+
+
+async def toggle_comment_like(red: redis.Redis, comment_id: uuid.UUID, video_id: uuid.UUID,
+                              user_id: uuid.UUID) -> tuple[int, int]:
+    likes, dislikes = await TOGGLE_COMMENT_LIKE(red, comment_script_keys(comment_id, video_id),
+                                                [str(user_id), str(comment_id)])
+    return likes, dislikes
+
+
+async def toggle_comment_dislike(red: redis.Redis, comment_id: uuid.UUID, video_id: uuid.UUID,
+                                 user_id: uuid.UUID) -> tuple[int, int]:
+    likes, dislikes = await TOGGLE_COMMENT_DISLIKE(red, comment_script_keys(comment_id, video_id),
+                                                   [str(user_id), str(comment_id)])
+    return likes, dislikes
+
+
+async def count_reactions(red: redis.Redis, comment_ids: typing.Sequence[uuid.UUID]) -> list[tuple[int, int]]:
+    """(likes, dislikes) for every comment of a page in one round trip."""
+    if not comment_ids:
+        return []
+    async with red.pipeline(transaction=False) as pipe:
+        for comment_id in comment_ids:
+            pipe.scard(RedisKeys.comment_likes(comment_id))
+            pipe.scard(RedisKeys.comment_dislikes(comment_id))
+        counts = await pipe.execute()
+    return list(zip(counts[::2], counts[1::2]))
+
+
+async def get_top_comments(red: redis.Redis, video_id: uuid.UUID, offset: int,
+                           limit: int) -> tuple[list[str], int]:
+    async with red.pipeline(transaction=False) as pipe:
+        pipe.zrevrange(RedisKeys.video_comment_scores(video_id), offset, offset + limit - 1)
+        pipe.zcard(RedisKeys.video_comment_scores(video_id))
+        ids, total = await pipe.execute()
+    return ids, total
+
+
+async def forget_video_comments(red: redis.Redis, video_id: uuid.UUID) -> None:
+    scores = RedisKeys.video_comment_scores(video_id)
+    comment_ids = await red.zrange(scores, 0, -1)
+    keys = [key for comment_id in comment_ids
+            for key in (RedisKeys.comment_likes(comment_id), RedisKeys.comment_dislikes(comment_id))]
+    await red.unlink(scores, *keys)
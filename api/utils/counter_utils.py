@@ -0,0 +1,54 @@
+import uuid
+
+import redis
+import sqlalchemy
+from sqlalchemy import select, delete, func, literal
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.utils.redis_utils import RedisKeys, APPLY_COUNTER, FILL_IF_CURRENT
+from db.models import VideoCounter, Video
+
+COUNTER_TTL = 60 * 10
+
+
+def video_counter_names(owner_id: uuid.UUID, is_private: bool) -> list[str]:
+    names = [RedisKeys.owner_videos_count(owner_id)]
+    if not is_private:
+        names.append(RedisKeys.public_videos_count())
+    return names
+
+
+async def change_counters(db: AsyncSession, names: list[str], delta: int) -> None:
+    """Adjust counters inside the caller's transaction; call apply_counters with the same delta after commit."""
+    for name in names:
+        stmt = insert(VideoCounter).values(name=name, value=delta)
+        await db.execute(stmt.on_conflict_do_update(index_elements=[VideoCounter.name],
+                                                    set_={"value": VideoCounter.value + delta}))
+
+
+async def apply_counters(red: redis.Redis, names: list[str], delta: int) -> None:
+    for name in names:
+        await APPLY_COUNTER(red, [name, RedisKeys.cache_version(name)], [delta, COUNTER_TTL])
+
+
+async def get_counter(name: str, db: AsyncSession, red: redis.Redis) -> int:
+    """Cached counter value; a fill racing with a committed change is dropped instead of caching the old row."""
+    value, version = await red.mget(name, RedisKeys.cache_version(name))
+    if value is not None:
+        return int(value)
+    value = (await db.execute(select(VideoCounter.value).where(VideoCounter.name == name))).scalar() or 0
+    await FILL_IF_CURRENT(red, [name, RedisKeys.cache_version(name)], [value, version or "", COUNTER_TTL])
+    return value
+
+
+async def rebuild_counters(db: AsyncSession) -> None:
+    """Recount every counter from the video table, e.g. after bulk loading rows outside the endpoints."""
+    await db.execute(delete(VideoCounter))
+    await db.execute(insert(VideoCounter).from_select(
+        ["name", "value"],
+        select(literal(RedisKeys.public_videos_count()), func.count()).where(Video.is_private == False)))
+    await db.execute(insert(VideoCounter).from_select(
+        ["name", "value"],
+        select(literal("owner_") + sqlalchemy.cast(Video.owner_id, sqlalchemy.String) + literal("_videos_count"),
+               func.count()).group_by(Video.owner_id)))
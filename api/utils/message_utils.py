@@ -1,53 +1,206 @@
-import smtplib
-from email.mime.multipart import MIMEMultipart
+import asyncio
+import logging
+import os
 from email.mime.text import MIMEText
+from typing import Optional, Iterable
 
-from fastapi import HTTPException
+import aiosmtplib
+from fastapi import HTTPException, Request
+from jinja2 import Environment, FileSystemLoader, Template
 
-from config import EMAIL_ADDRESS, EMAIL_PASS, APP_HOST, APP_PORT
+from config import EMAIL_ADDRESS, EMAIL_PASS, APP_HOST, APP_PORT, SMTP_HOST, SMTP_PORT, SMTP_USE_TLS, \
+    MAIL_QUEUE_SIZE, MAIL_BATCH_SIZE, MAIL_MAX_ATTEMPTS, MAIL_RETRY_BACKOFF, MAIL_IDLE_TIMEOUT, DEFAULT_LOCALE
 
+logger = logging.getLogger(__name__)
 
-def send_verify_message(token, email):
-    text = f"""<html>
-      <body>
-      <p>Здравствуйте. Вы прошли регистрацию на сайте brave-urfub.</p>
-      <p>
-        пройдите по ссылке: <a href='http://{APP_HOST}:{APP_PORT}/verificacion/{token}'>http://{APP_HOST}:{APP_PORT}g/verificacion/{token}</a>,
-         чтобы подтверить вашу учетную запись.
-      </p>
-      <p> Если вы не регистрировались на сайте, то проигнорируйте данное сообщение. </p>
-      </body>
-    </html>"""
-    send(text, email)
 
+class MailTemplates:
+    """Mail templates compiled once and kept in memory, keyed by (locale, name).
 
-def send_reset_message(token, email):
-    text = f"""<html>
-      <body>
-      <p>Здравствуйте. Вы поступил запрос на смену пароля на сайте brave-urfub.</p>
-      <p>
-        пройдите по ссылке: <a href='http://{APP_HOST}:{APP_PORT}/reset-password/{token}'>http://{APP_HOST}:{APP_PORT}/reset-password/{token}</a>
-        если вы и вправду хотите поменять свой пароль.
-      </p>
-      <p> Если вы не делали запрос, то проигнорируйте данное сообщение. </p>
-      </body>
-    </html>"""
+    Each template sets its own `subject`, which is read from the compiled module
+    so it is not re-rendered per message.
+    """
 
-    send(text, email)
+    def __init__(self, directory: str, default_locale: str):
+        self.directory = directory
+        self.default_locale = default_locale
+        self.env = Environment(loader=FileSystemLoader(directory), autoescape=True, trim_blocks=True)
+        self.cache: dict[tuple[str, str], Template] = {}
 
+    def load(self) -> None:
+        for locale in os.listdir(self.directory):
+            for filename in os.listdir(os.path.join(self.directory, locale)):
+                name, _ = os.path.splitext(filename)
+                self.cache[(locale, name)] = self.env.get_template(f"{locale}/{filename}")
 
-def send(text, email):
-    server = smtplib.SMTP_SSL("smtp.yandex.ru", 465)
-    msg = MIMEMultipart()
-    msg['From'] = EMAIL_ADDRESS
+    @property
+    def locales(self) -> set[str]:
+        return {locale for locale, _ in self.cache}
+
+    def get(self, name: str, locale: Optional[str] = None) -> Template:
+        if not self.cache:
+            self.load()
+        return self.cache.get((locale, name)) or self.cache[(self.default_locale, name)]
+
+    def render(self, name: str, locale: Optional[str] = None, **context) -> tuple[str, str]:
+        template = self.get(name, locale)
+        return template.module.subject, template.render(**context)
+
+    def render_many(self, name: str, locale: Optional[str], contexts: Iterable[dict]) -> list[tuple[str, str]]:
+        template = self.get(name, locale)
+        subject = template.module.subject
+        return [(subject, template.render(**context)) for context in contexts]
+
+
+mail_templates = MailTemplates(os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates", "mail"),
+                               DEFAULT_LOCALE)
+
+
+def get_locale(request: Optional[Request]) -> str:
+    """Pick the first supported language from Accept-Language."""
+    if request is None:
+        return DEFAULT_LOCALE
+    for item in request.headers.get("Accept-Language", "").split(","):
+        locale = item.split(";")[0].strip().split("-")[0].lower()
+        if locale in mail_templates.locales:
+            return locale
+    return DEFAULT_LOCALE
+
+
+def send_verify_message(token, email, locale: Optional[str] = None):
+    send("verify", email, locale, link=f"http://{APP_HOST}:{APP_PORT}/verificacion/{token}")
+
+
+def send_reset_message(token, email, locale: Optional[str] = None):
+    send("reset", email, locale, link=f"http://{APP_HOST}:{APP_PORT}/reset-password/{token}")
+
+
+def send(template, email, locale: Optional[str] = None, **context):
+    subject, text = mail_templates.render(template, locale, **context)
+    mail_queue.push(build_message(subject, text, email))
+
+
+async def send_bulk(template: str, locale: Optional[str], recipients: list[tuple[str, dict]]) -> None:
+    """Render one template for many recipients and queue the messages, waiting when the queue is full."""
+    rendered = mail_templates.render_many(template, locale, (context for _, context in recipients))
+    for (email, _), (subject, text) in zip(recipients, rendered):
+        await mail_queue.put(build_message(subject, text, email))
 
+
+def build_message(subject, text, email) -> MIMEText:
+    msg = MIMEText(text, 'html')
+    msg['From'] = EMAIL_ADDRESS
     msg['To'] = email
+    msg['Subject'] = subject
+    return msg
+
+
+class MailQueue:
+    """Sends queued messages from a background task over one reused, authenticated SMTP connection.
+
+    Whatever is already waiting is sent as one batch on the same connection; failed messages are
+    re-queued with exponential backoff until max_attempts is reached.
+    """
+
+    def __init__(self, maxsize: int, batch_size: int, max_attempts: int, backoff: float, idle_timeout: float):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.queue: Optional[asyncio.Queue] = None
+        self.smtp: Optional[aiosmtplib.SMTP] = None
+        self.task: Optional[asyncio.Task] = None
+        self.retries: set[asyncio.Task] = set()
+        self.running = False
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    async def start(self) -> None:
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+        self.running = True
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop accepting retries and send whatever is still queued."""
+        if self.task is None:
+            return
+        self.running = False
+        for task in self.retries:
+            task.cancel()
+        await self.queue.join()
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        await self._disconnect()
+        self.task = None
+
+    async def put(self, msg: MIMEText) -> None:
+        await self.queue.put((msg, 0))
+
+    def push(self, msg: MIMEText, attempt: int = 0) -> None:
+        try:
+            self.queue.put_nowait((msg, attempt))
+        except asyncio.QueueFull:
+            raise HTTPException(503, "mail queue is full")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                batch = [await asyncio.wait_for(self.queue.get(), self.idle_timeout)]
+            except asyncio.TimeoutError:
+                await self._disconnect()
+                continue
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            for msg, attempt in batch:
+                await self._send(msg, attempt)
+                self.queue.task_done()
+
+    async def _send(self, msg: MIMEText, attempt: int) -> None:
+        try:
+            await self._connect()
+            await self.smtp.send_message(msg)
+            self.sent += 1
+        except Exception:
+            logger.exception("failed to send mail to %s, attempt %d", msg["To"], attempt + 1)
+            await self._disconnect()
+            if attempt + 1 >= self.max_attempts or not self.running:
+                self.failed += 1
+                return
+            self.retried += 1
+            task = asyncio.create_task(self._retry_later(msg, attempt + 1))
+            self.retries.add(task)
+            task.add_done_callback(self.retries.discard)
+
+    async def _retry_later(self, msg: MIMEText, attempt: int) -> None:
+        await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+        try:
+            self.queue.put_nowait((msg, attempt))
+        except asyncio.QueueFull:
+            self.failed += 1
+
+    async def _connect(self) -> None:
+        if self.smtp is not None and self.smtp.is_connected:
+            return
+        self.smtp = aiosmtplib.SMTP(hostname=SMTP_HOST, port=SMTP_PORT, use_tls=SMTP_USE_TLS)
+        await self.smtp.connect()
+        if EMAIL_PASS:
+            await self.smtp.login(EMAIL_ADDRESS, EMAIL_PASS)
+
+    async def _disconnect(self) -> None:
+        if self.smtp is not None and self.smtp.is_connected:
+            try:
+                await self.smtp.quit()
+            except aiosmtplib.SMTPException:
+                self.smtp.close()
+        self.smtp = None
+
+    def stats(self) -> dict:
+        return {"queued": self.queue.qsize() if self.queue is not None else 0,
+                "sent": self.sent,
+                "retried": self.retried,
+                "failed": self.failed}
 
-    msg['Subject'] = "it's test"
 
-    msg.attach(MIMEText(text, 'html'))
-    try:
-        server.login(msg['From'], EMAIL_PASS)
-        server.sendmail(msg["From"], msg["To"], msg.as_string())
-    except Exception as ex:
-        raise HTTPException(400, ex.args)
+mail_queue = MailQueue(MAIL_QUEUE_SIZE, MAIL_BATCH_SIZE, MAIL_MAX_ATTEMPTS, MAIL_RETRY_BACKOFF, MAIL_IDLE_TIMEOUT)
@@ -0,0 +1,157 @@
+import asyncio
+import io
+import json
+import logging
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import redis
+from PIL import Image, ImageOps
+from sqlalchemy import update
+
+from api.utils.cache_utils import video_cache
+from api.utils.redis_utils import RedisKeys, RECLAIM_JOBS
+from api.utils.s3_utils import download_object, upload_bytes, delete_objects, get_key_from_url
+from config import PREVIEW_PROCESSES, PREVIEW_MAX_ATTEMPTS
+from db.models import Video
+from db.session import async_session_maker
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_WIDTHS = {"feed": 320, "card": 640, "full": 1280}
+PREVIEW_QUALITY = 80
+Image.MAX_IMAGE_PIXELS = 50_000_000
+
+
+def render_previews(data: bytes) -> dict[str, bytes]:
+    """Decode an image and encode it as WebP at every PREVIEW_WIDTHS width; runs in the process pool."""
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    variants = {}
+    for name, width in PREVIEW_WIDTHS.items():
+        variant = image
+        if image.width > width:
+            variant = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        out = io.BytesIO()
+        variant.save(out, "WEBP", quality=PREVIEW_QUALITY, method=4)
+        variants[name] = out.getvalue()
+    return variants
+
+
+async def enqueue_preview(red: redis.Redis, video_id: uuid.UUID, key: str, url: str) -> None:
+    await red.lpush(RedisKeys.preview_jobs(), json.dumps({"video_id": str(video_id), "key": key, "url": url,
+                                                          "attempts": 0}))
+
+
+async def delete_previews(previews: Optional[dict[str, str]]) -> None:
+    """Remove preview variants from storage; a failure only leaves orphaned objects, so it is logged."""
+    if not previews:
+        return
+    try:
+        await delete_objects([get_key_from_url(url) for url in previews.values()])
+    except Exception:
+        logger.exception("failed to delete preview variants %s", list(previews.values()))
+
+
+class PreviewWorker:
+    """Takes jobs from the Redis queue and renders preview variants in a process pool.
+
+    A job is moved to this worker's processing list while it runs and removed only once it is done,
+    so jobs of a worker that dies mid-job go back on the queue when its heartbeat expires.
+    """
+
+    # refreshed between jobs, so it has to outlast the slowest job
+    heartbeat_ttl = 300
+    reclaim_interval = 60
+
+    def __init__(self, processes: int, max_attempts: int):
+        self.processes = processes
+        self.max_attempts = max_attempts
+        self.worker_id = uuid.uuid4().hex
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.red: Optional[redis.Redis] = None
+        self.task: Optional[asyncio.Task] = None
+        self.running = False
+
+    @property
+    def processing(self) -> str:
+        return RedisKeys.preview_jobs_processing(self.worker_id)
+
+    async def start(self, red: redis.Redis) -> None:
+        self.red = red
+        self.pool = ProcessPoolExecutor(max_workers=self.processes)
+        self.running = True
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task is None:
+            return
+        self.running = False
+        await self.task
+        self.pool.shutdown()
+        await self.red.delete(RedisKeys.preview_worker_alive(self.worker_id))
+        self.task = None
+
+    async def reclaim(self) -> int:
+        """Requeue the jobs of workers whose heartbeat has expired."""
+        reclaimed = 0
+        async for key in self.red.scan_iter(match=RedisKeys.preview_jobs_processing("*")):
+            worker_id = key.rsplit("_", 1)[1]
+            reclaimed += await RECLAIM_JOBS(self.red, [key, RedisKeys.preview_worker_alive(worker_id),
+                                                       RedisKeys.preview_jobs()], [])
+        return reclaimed
+
+    async def _run(self) -> None:
+        next_reclaim = 0.0
+        while self.running:
+            try:
+                await self.red.set(RedisKeys.preview_worker_alive(self.worker_id), 1, ex=self.heartbeat_ttl)
+                if time.monotonic() >= next_reclaim:
+                    next_reclaim = time.monotonic() + self.reclaim_interval
+                    if reclaimed := await self.reclaim():
+                        logger.warning("requeued %d preview jobs of stopped workers", reclaimed)
+                raw = await self.red.blmove(RedisKeys.preview_jobs(), self.processing, 1, "RIGHT", "LEFT")
+            except redis.RedisError:
+                logger.exception("failed to read preview jobs")
+                await asyncio.sleep(1)
+                continue
+            if raw is None:
+                continue
+            job = json.loads(raw)
+            try:
+                await self.process(job)
+            except Exception:
+                logger.exception("preview job for video %s failed", job["video_id"])
+                job["attempts"] += 1
+                if job["attempts"] < self.max_attempts:
+                    async with self.red.pipeline(transaction=True) as pipe:
+                        pipe.lrem(self.processing, 1, raw)
+                        pipe.lpush(RedisKeys.preview_jobs(), json.dumps(job))
+                        await pipe.execute()
+                    continue
+            await self.red.lrem(self.processing, 1, raw)
+
+    async def process(self, job: dict) -> None:
+        video_id = uuid.UUID(job["video_id"])
+        data = await download_object(job["key"])
+        variants = await asyncio.get_running_loop().run_in_executor(self.pool, render_previews, data)
+
+        previews = {}
+        for name, body in variants.items():
+            previews[name] = await upload_bytes(f"previews/{video_id}/{uuid.uuid4()}_{name}.webp", body, "image/webp")
+
+        async with async_session_maker() as db:
+            # skip the update if the owner uploaded another preview or deleted the video in the meantime
+            res = await db.execute(update(Video).where(Video.id == video_id, Video.preview == job["url"])
+                                   .values(previews=previews))
+            await db.commit()
+        if res.rowcount == 0:
+            await delete_previews(previews)
+            return
+        await video_cache.invalidate(video_id, self.red)
+
+
+preview_worker = PreviewWorker(PREVIEW_PROCESSES, PREVIEW_MAX_ATTEMPTS)
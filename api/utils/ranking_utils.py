@@ -0,0 +1,79 @@
+import time
+import uuid
+from collections import Counter
+
+import redis
+
+from api.utils.redis_utils import RedisKeys
+from config import TRENDING_WINDOW_HOURS, TRENDING_DECAY, TRENDING_REFRESH, TRENDING_VIEW_WEIGHT, \
+    TRENDING_LIKE_WEIGHT
+
+TOP_METRICS = ("views", "likes")
+
+
+def current_hour() -> int:
+    return int(time.time() // 3600)
+
+
+def trending_bucket_ttl() -> int:
+    return (TRENDING_WINDOW_HOURS + 1) * 3600
+
+
+def like_ranking_keys(video_id: uuid.UUID, hour: int) -> list[str]:
+    return [RedisKeys.top_videos("likes"), RedisKeys.trending_bucket(hour), RedisKeys.video_like_hours(video_id)]
+
+
+def like_ranking_args(hour: int) -> list:
+    return [TRENDING_LIKE_WEIGHT, trending_bucket_ttl(), hour, RedisKeys.trending_bucket_prefix()]
+
+
+def queue_rank_views(pipe, views: Counter) -> None:
+    """Add new unique views to the all-time top and to the trending bucket of the current hour."""
+    bucket = RedisKeys.trending_bucket(current_hour())
+    for video_id, count in views.items():
+        pipe.zincrby(RedisKeys.top_videos("views"), count, str(video_id))
+        pipe.zincrby(bucket, count * TRENDING_VIEW_WEIGHT, str(video_id))
+    pipe.expire(bucket, trending_bucket_ttl())
+
+
+async def get_ranking(red: redis.Redis, key: str, offset: int, limit: int) -> tuple[list[tuple[str, float]], int]:
+    async with red.pipeline(transaction=False) as pipe:
+        pipe.zrevrange(key, offset, offset + limit - 1, withscores=True)
+        pipe.zcard(key)
+        ranked, total = await pipe.execute()
+    return ranked, total
+
+
+async def get_top(red: redis.Redis, metric: str, offset: int, limit: int) -> tuple[list[tuple[str, float]], int]:
+    return await get_ranking(red, RedisKeys.top_videos(metric), offset, limit)
+
+
+async def get_trending(red: redis.Redis, offset: int, limit: int) -> tuple[list[tuple[str, float]], int]:
+    key = RedisKeys.trending_videos()
+    if not await red.exists(key):
+        await refresh_trending(red)
+    return await get_ranking(red, key, offset, limit)
+
+
+async def refresh_trending(red: redis.Redis) -> None:
+    """Merge the hourly buckets of the window, each weighted down by its age, into the trending set.
+
+    The merged set expires after TRENDING_REFRESH seconds and the next read rebuilds it.
+    """
+    hour = current_hour()
+    weights = {RedisKeys.trending_bucket(hour - age): TRENDING_DECAY ** age for age in range(TRENDING_WINDOW_HOURS)}
+    async with red.pipeline(transaction=True) as pipe:
+        pipe.zunionstore(RedisKeys.trending_videos(), weights)
+        pipe.expire(RedisKeys.trending_videos(), TRENDING_REFRESH)
+        await pipe.execute()
+
+
+async def forget_video_rankings(red: redis.Redis, video_id: uuid.UUID) -> None:
+    hour = current_hour()
+    async with red.pipeline(transaction=False) as pipe:
+        for metric in TOP_METRICS:
+            pipe.zrem(RedisKeys.top_videos(metric), str(video_id))
+        for age in range(TRENDING_WINDOW_HOURS):
+            pipe.zrem(RedisKeys.trending_bucket(hour - age), str(video_id))
+        pipe.zrem(RedisKeys.trending_videos(), str(video_id))
+        await pipe.execute()
@@ -1,5 +1,8 @@
+import hashlib
 import uuid
 
+import redis
+
 
 class RedisKeys:
 
@@ -7,6 +10,14 @@ class RedisKeys:
     def video_views(video_id: uuid.UUID) -> str:
         return f"video_{video_id}_views"
 
+    @staticmethod
+    def video_views_hll(video_id: uuid.UUID) -> str:
+        return f"video_{video_id}_views_hll"
+
+    @staticmethod
+    def video_meta(video_id: uuid.UUID) -> str:
+        return f"video_{video_id}_meta"
+
     @staticmethod
     def video_likes(video_id: uuid.UUID) -> str:
         return f"video_{video_id}_likes"
@@ -19,6 +30,14 @@ class RedisKeys:
     def user_views(user_id: uuid.UUID) -> str:
         return f"user_{user_id}_views"
 
+    @staticmethod
+    def user_view_history(user_id: uuid.UUID) -> str:
+        return f"user_{user_id}_view_history"
+
+    @staticmethod
+    def user_auth(user_id: uuid.UUID) -> str:
+        return f"user_{user_id}_auth"
+
     @staticmethod
     def user_likes(user_id: uuid.UUID) -> str:
         return f"user_{user_id}_likes"
@@ -29,4 +48,203 @@ class RedisKeys:
 
     @staticmethod
     def comment_dislikes(comment_id: uuid.UUID) -> str:
-        return f"comment_{comment_id}_dislike"
\ No newline at end of file
+        return f"comment_{comment_id}_dislike"
+
+    @staticmethod
+    def video_comment_scores(video_id: uuid.UUID) -> str:
+        return f"video_{video_id}_comment_scores"
+
+    @staticmethod
+    def direct_upload(upload_id: uuid.UUID) -> str:
+        return f"direct_upload_{upload_id}"
+
+    @staticmethod
+    def preview_jobs() -> str:
+        return "preview_jobs"
+
+    @staticmethod
+    def preview_jobs_processing(worker_id: str) -> str:
+        return f"preview_jobs_processing_{worker_id}"
+
+    @staticmethod
+    def preview_worker_alive(worker_id: str) -> str:
+        return f"preview_worker_{worker_id}_alive"
+
+    @staticmethod
+    def top_videos(metric: str) -> str:
+        return f"top_videos_{metric}"
+
+    @staticmethod
+    def trending_bucket(hour: int) -> str:
+        return f"{RedisKeys.trending_bucket_prefix()}{hour}"
+
+    @staticmethod
+    def trending_bucket_prefix() -> str:
+        return "trending_videos_"
+
+    @staticmethod
+    def video_like_hours(video_id: uuid.UUID) -> str:
+        return f"video_{video_id}_like_hours"
+
+    @staticmethod
+    def trending_videos() -> str:
+        return "trending_videos"
+
+    @staticmethod
+    def feed_page(page_key: str) -> str:
+        return f"feed_page_{page_key}"
+
+    @staticmethod
+    def feed_page_lock(page_key: str) -> str:
+        return f"feed_page_{page_key}_lock"
+
+    @staticmethod
+    def public_videos_count() -> str:
+        return "public_videos_count"
+
+    @staticmethod
+    def owner_videos_count(owner_id: uuid.UUID) -> str:
+        return f"owner_{owner_id}_videos_count"
+
+    @staticmethod
+    def cache_version(key: str) -> str:
+        return f"{key}_version"
+
+
+class LuaScript:
+    """Runs a script by its SHA and falls back to EVAL (which caches it) when the server does not know it yet."""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.sha = hashlib.sha1(source.encode()).hexdigest()
+
+    async def __call__(self, red: redis.Redis, keys: list, args: list):
+        try:
+            return await red.evalsha(self.sha, len(keys), *keys, *args)
+        except redis.exceptions.NoScriptError:
+            return await red.eval(self.source, len(keys), *keys, *args)
+
+
+# Takes a like's weight back out of the trending bucket of the hour it was given, unless that
+# bucket has already expired. The bucket key is built from ARGV[6], so buckets must share a node.
+UNDO_TRENDING_LIKE = """
+local hour = redis.call('HGET', KEYS[6], ARGV[1])
+redis.call('HDEL', KEYS[6], ARGV[1])
+if hour then
+    local bucket = ARGV[6] .. hour
+    if redis.call('ZSCORE', bucket, ARGV[2]) then
+        redis.call('ZINCRBY', bucket, -ARGV[3], ARGV[2])
+    end
+end
+"""
+
+# KEYS: video likes, video dislikes, user likes, top by likes, current trending bucket, like hours
+# ARGV: user id, video id, trending weight of a like, trending bucket ttl, current hour, trending bucket prefix
+# Returns {likes, dislikes} after the change.
+TOGGLE_LIKE = LuaScript("""
+redis.call('SREM', KEYS[2], ARGV[1])
+if redis.call('SREM', KEYS[1], ARGV[1]) == 1 then
+    redis.call('SREM', KEYS[3], ARGV[2])
+""" + UNDO_TRENDING_LIKE + """
+else
+    redis.call('SADD', KEYS[1], ARGV[1])
+    redis.call('SADD', KEYS[3], ARGV[2])
+    redis.call('ZINCRBY', KEYS[5], ARGV[3], ARGV[2])
+    redis.call('EXPIRE', KEYS[5], ARGV[4])
+    redis.call('HSET', KEYS[6], ARGV[1], ARGV[5])
+end
+local likes = redis.call('SCARD', KEYS[1])
+redis.call('ZADD', KEYS[4], likes, ARGV[2])
+return {likes, redis.call('SCARD', KEYS[2])}
+""")
+
+# Same KEYS and ARGV as TOGGLE_LIKE.
+# Returns {likes, dislikes} after the change.
+TOGGLE_DISLIKE = LuaScript("""
+if redis.call('SREM', KEYS[1], ARGV[1]) == 1 then
+    redis.call('SREM', KEYS[3], ARGV[2])
+""" + UNDO_TRENDING_LIKE + """
+end
+if redis.call('SREM', KEYS[2], ARGV[1]) == 0 then
+    redis.call('SADD', KEYS[2], ARGV[1])
+end
+local likes = redis.call('SCARD', KEYS[1])
+redis.call('ZADD', KEYS[4], likes, ARGV[2])
+return {likes, redis.call('SCARD', KEYS[2])}
+""")
+
+# KEYS: comment likes, comment dislikes, video comment scores; ARGV: user id, comment id
+# Returns {likes, dislikes} after the change; the comment's score is likes - dislikes.
+TOGGLE_COMMENT_LIKE = LuaScript("""
+redis.call('SREM', KEYS[2], ARGV[1])
+if redis.call('SREM', KEYS[1], ARGV[1]) == 0 then
+    redis.call('SADD', KEYS[1], ARGV[1])
+end
+local likes = redis.call('SCARD', KEYS[1])
+local dislikes = redis.call('SCARD', KEYS[2])
+redis.call('ZADD', KEYS[3], likes - dislikes, ARGV[2])
+return {likes, dislikes}
+""")
+
+# Same KEYS and ARGV as TOGGLE_COMMENT_LIKE.
+TOGGLE_COMMENT_DISLIKE = LuaScript("""
+redis.call('SREM', KEYS[1], ARGV[1])
+if redis.call('SREM', KEYS[2], ARGV[1]) == 0 then
+    redis.call('SADD', KEYS[2], ARGV[1])
+end
+local likes = redis.call('SCARD', KEYS[1])
+local dislikes = redis.call('SCARD', KEYS[2])
+redis.call('ZADD', KEYS[3], likes - dislikes, ARGV[2])
+return {likes, dislikes}
+""")
+
+# KEYS: counter, counter version; ARGV: delta, version ttl
+# Called after the change is committed: bumps the version so in-flight fills are discarded
+# and applies the delta to the cached value if there is one.
+APPLY_COUNTER = LuaScript("""
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+""")
+
+# KEYS: cached key, its version; ARGV: version ttl
+# Called after the change is committed: bumps the version so in-flight fills are discarded.
+INVALIDATE_CACHE = LuaScript("""
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+redis.call('DEL', KEYS[1])
+""")
+
+# KEYS: cached key, its version; ARGV: value, version seen before reading the database, ttl
+# Caches the value only if no change was applied since that version was read; returns 1 if it did.
+FILL_IF_CURRENT = LuaScript("""
+if (redis.call('GET', KEYS[2]) or '') == ARGV[2] then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3], 'NX')
+    return 1
+end
+return 0
+""")
+
+# KEYS: processing list, its worker's heartbeat, job queue
+# Puts the jobs of a worker that stopped sending heartbeats back on the queue; returns how many.
+RECLAIM_JOBS = LuaScript("""
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return 0
+end
+local moved = 0
+while redis.call('LMOVE', KEYS[1], KEYS[3], 'RIGHT', 'RIGHT') do
+    moved = moved + 1
+end
+return moved
+""")
+
+# KEYS: lock; ARGV: token
+# Deletes the lock only if it is still held with this token.
+RELEASE_LOCK = LuaScript("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+""")
@@ -1,42 +1,234 @@
+import asyncio
 import uuid
-import boto3
+from contextlib import AsyncExitStack
+from typing import Optional
+
 import aioboto3
+from aiobotocore.config import AioConfig
+from botocore.exceptions import ClientError
 from fastapi import UploadFile, Request
-from starlette.concurrency import run_in_threadpool
-from streaming_form_data.targets import S3Target
+from streaming_form_data.targets import BaseTarget
 
-from config import ACCESS_KEY_ID, SECRET_ACCESS_KEY, BUCKET_NAME
+from config import ACCESS_KEY_ID, SECRET_ACCESS_KEY, BUCKET_NAME, S3_PART_SIZE, S3_UPLOAD_CONCURRENCY, \
+    S3_ENDPOINT_URL, S3_MAX_CONNECTIONS, S3_KEEPALIVE_TIMEOUT
 
 from streaming_form_data import StreamingFormDataParser
 
 conf = {
     "service_name": 's3',
-    "endpoint_url": "https://storage.yandexcloud.net",
+    "endpoint_url": S3_ENDPOINT_URL,
     "aws_secret_access_key": SECRET_ACCESS_KEY,
     "aws_access_key_id": ACCESS_KEY_ID
 }
 
+s3_stack: Optional[AsyncExitStack] = None
+s3_client = None
+s3_requests = 0
+
+
+def count_request(**kwargs) -> None:
+    global s3_requests
+    s3_requests += 1
+
+
+async def open_s3_client() -> None:
+    """Open the application-wide S3 client; its aiohttp pool keeps connections alive between calls."""
+    global s3_stack, s3_client
+    s3_stack = AsyncExitStack()
+    config = AioConfig(max_pool_connections=S3_MAX_CONNECTIONS,
+                       connector_args={"keepalive_timeout": S3_KEEPALIVE_TIMEOUT})
+    s3_client = await s3_stack.enter_async_context(aioboto3.Session().client(**conf, config=config))
+    s3_client.meta.events.register("before-send.s3", count_request)
+
+
+async def close_s3_client() -> None:
+    global s3_stack, s3_client
+    if s3_stack is not None:
+        await s3_stack.aclose()
+    s3_stack = s3_client = None
 
-async def upload_image(file: UploadFile) -> str:
-    key = get_key(file.filename, "images/")
-    async with aioboto3.Session().client(**conf) as s3:
-        await s3.upload_fileobj(file, BUCKET_NAME, key)
-        return get_url_to_obj(key)
+
+def s3_stats() -> dict:
+    stats = {"requests": s3_requests, "max_connections": S3_MAX_CONNECTIONS}
+    connector = getattr(getattr(getattr(s3_client, "_endpoint", None), "http_session", None), "_connector", None)
+    if connector is not None:
+        stats["in_use"] = len(connector._acquired)
+        stats["idle"] = sum(len(conns) for conns in connector._conns.values())
+    return stats
+
+
+async def upload_image(file: UploadFile, key: str) -> str:
+    await s3_client.upload_fileobj(file, BUCKET_NAME, key)
+    return get_url_to_obj(key)
+
+
+async def upload_bytes(key: str, data: bytes, content_type: str) -> str:
+    await s3_client.put_object(Bucket=BUCKET_NAME, Key=key, Body=data, ContentType=content_type)
+    return get_url_to_obj(key)
+
+
+async def download_object(key: str) -> bytes:
+    res = await s3_client.get_object(Bucket=BUCKET_NAME, Key=key)
+    async with res["Body"] as body:
+        return await body.read()
 
 
 def get_url_to_obj(key: str) -> str:
     return f" {conf['endpoint_url']}/{BUCKET_NAME}/{key}"
 
 
+def get_key_from_url(url: str) -> str:
+    return url.split(f"/{BUCKET_NAME}/", 1)[1]
+
+
 def get_key(filename, directory="") -> str:
     return f"{directory}{uuid.uuid4()}_{filename}"
 
 
+class BufferTarget(BaseTarget):
+    """Form-data target that keeps the parsed file bytes in memory until they are sent as a part."""
+
+    def __init__(self):
+        super().__init__()
+        self.buffer = bytearray()
+
+    def on_data_received(self, chunk: bytes):
+        self.buffer.extend(chunk)
+
+
+class MultipartUpload:
+    """S3 multipart upload that sends up to `concurrency` parts at once.
+
+    `send` waits for a free slot, which stops the caller from reading more of the request
+    while that many parts are already in flight.
+    """
+
+    def __init__(self, s3, key: str, concurrency: int):
+        self.s3 = s3
+        self.key = key
+        self.slots = asyncio.Semaphore(concurrency)
+        self.tasks: list[asyncio.Task] = []
+        self.upload_id = None
+
+    async def start(self) -> None:
+        res = await self.s3.create_multipart_upload(Bucket=BUCKET_NAME, Key=self.key)
+        self.upload_id = res["UploadId"]
+
+    async def send(self, data: bytes) -> None:
+        await self.slots.acquire()
+        for task in self.tasks:
+            if task.done() and task.exception() is not None:
+                self.slots.release()
+                raise task.exception()
+        self.tasks.append(asyncio.create_task(self._upload_part(len(self.tasks) + 1, data)))
+
+    async def _upload_part(self, part_number: int, data: bytes) -> dict:
+        try:
+            res = await self.s3.upload_part(Bucket=BUCKET_NAME, Key=self.key, PartNumber=part_number,
+                                            UploadId=self.upload_id, Body=data)
+            return {"PartNumber": part_number, "ETag": res["ETag"]}
+        finally:
+            self.slots.release()
+
+    async def complete(self) -> None:
+        parts = await asyncio.gather(*self.tasks)
+        await self.s3.complete_multipart_upload(Bucket=BUCKET_NAME, Key=self.key, UploadId=self.upload_id,
+                                                MultipartUpload={"Parts": parts})
+
+    async def abort(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.upload_id is not None:
+            await self.s3.abort_multipart_upload(Bucket=BUCKET_NAME, Key=self.key, UploadId=self.upload_id)
+
+
 async def upload_video(request: Request, filename: str) -> str:
     key = get_key(filename, "videos/")
+    target = BufferTarget()
     parser = StreamingFormDataParser(headers=request.headers)
-    parser.register("file", S3Target(f"s3://{BUCKET_NAME}/{key}", "wb", {"client": boto3.Session().client(**conf)}))
+    parser.register("file", target)
 
-    async for chunk in request.stream():
-        await run_in_threadpool(parser.data_received, chunk)
+    upload = MultipartUpload(s3_client, key, S3_UPLOAD_CONCURRENCY)
+    try:
+        await upload.start()
+        async for chunk in request.stream():
+            parser.data_received(chunk)
+            while len(target.buffer) >= S3_PART_SIZE:
+                await upload.send(bytes(target.buffer[:S3_PART_SIZE]))
+                del target.buffer[:S3_PART_SIZE]
+        if target.buffer or not upload.tasks:
+            await upload.send(bytes(target.buffer))
+        await upload.complete()
+    except BaseException:
+        # covers ClientDisconnect from request.stream() as well as failed parts
+        await upload.abort()
+        raise
     return get_url_to_obj(key)
+
+
+async def create_multipart_upload(key: str) -> str:
+    return (await s3_client.create_multipart_upload(Bucket=BUCKET_NAME, Key=key))["UploadId"]
+
+
+async def upload_part(key: str, upload_id: str, part_number: int, body: bytes, content_md5: str) -> str:
+    """Upload one part; S3 rejects it with BadDigest if the body does not match content_md5."""
+    res = await s3_client.upload_part(Bucket=BUCKET_NAME, Key=key, UploadId=upload_id, PartNumber=part_number,
+                                      Body=body, ContentMD5=content_md5)
+    return res["ETag"]
+
+
+async def list_parts(key: str, upload_id: str) -> list[dict]:
+    """Parts S3 has stored for a multipart upload, in part number order."""
+    parts = []
+    async for page in s3_client.get_paginator("list_parts").paginate(Bucket=BUCKET_NAME, Key=key, UploadId=upload_id):
+        parts.extend(page.get("Parts", []))
+    return parts
+
+
+async def list_objects(prefix: str) -> list[dict]:
+    objects = []
+    async for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=BUCKET_NAME, Prefix=prefix):
+        objects.extend(page.get("Contents", []))
+    return objects
+
+
+async def complete_multipart_upload(key: str, upload_id: str, parts: list[dict]) -> None:
+    await s3_client.complete_multipart_upload(Bucket=BUCKET_NAME, Key=key, UploadId=upload_id,
+                                              MultipartUpload={"Parts": parts})
+
+
+async def abort_multipart_upload(key: str, upload_id: str) -> None:
+    await s3_client.abort_multipart_upload(Bucket=BUCKET_NAME, Key=key, UploadId=upload_id)
+
+
+async def presign_put(key: str, content_type: str, expires_in: int) -> str:
+    return await s3_client.generate_presigned_url("put_object",
+                                                  Params={"Bucket": BUCKET_NAME, "Key": key,
+                                                          "ContentType": content_type},
+                                                  ExpiresIn=expires_in)
+
+
+async def head_object(key: str) -> Optional[dict]:
+    try:
+        return await s3_client.head_object(Bucket=BUCKET_NAME, Key=key)
+    except ClientError as ex:
+        if ex.response["Error"]["Code"] in ("404", "NoSuchKey"):
+            return None
+        raise
+
+
+async def copy_object(source_key: str, key: str, etag: str) -> None:
+    """Server-side copy; S3 fails it with PreconditionFailed if the source no longer has this ETag."""
+    await s3_client.copy_object(Bucket=BUCKET_NAME, Key=key, CopySource={"Bucket": BUCKET_NAME, "Key": source_key},
+                                CopySourceIfMatch=etag)
+
+
+async def delete_object(key: str) -> None:
+    await s3_client.delete_object(Bucket=BUCKET_NAME, Key=key)
+
+
+async def delete_objects(keys: list[str]) -> None:
+    if keys:
+        await s3_client.delete_objects(Bucket=BUCKET_NAME, Delete={"Objects": [{"Key": key} for key in keys],
+                                                                   "Quiet": True})
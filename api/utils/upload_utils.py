@@ -0,0 +1,90 @@
+import asyncio
+import datetime
+import logging
+from typing import Optional
+
+from botocore.exceptions import ClientError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.utils.s3_utils import abort_multipart_upload, delete_object, list_objects, delete_objects
+from config import UPLOAD_SESSION_TTL, UPLOAD_SWEEP_INTERVAL
+from db.models import UploadSession
+from db.session import async_session_maker
+
+logger = logging.getLogger(__name__)
+
+SWEEP_BATCH = 100
+STAGING_PREFIX = "uploads/"
+
+
+async def discard_upload(session: UploadSession) -> None:
+    """Abort the multipart upload; if S3 already completed it but no video was saved, delete the object."""
+    try:
+        await abort_multipart_upload(session.key, session.s3_upload_id)
+    except ClientError as ex:
+        if ex.response["Error"]["Code"] != "NoSuchUpload":
+            raise
+        await delete_object(session.key)
+
+
+async def expire_upload_sessions(db: AsyncSession) -> int:
+    """Discard sessions older than UPLOAD_SESSION_TTL; rows locked by another worker are left to it."""
+    deadline = datetime.datetime.utcnow() - datetime.timedelta(seconds=UPLOAD_SESSION_TTL)
+    sessions = (await db.execute(select(UploadSession)
+                                 .where(UploadSession.created_date < deadline)
+                                 .limit(SWEEP_BATCH)
+                                 .with_for_update(skip_locked=True))).scalars().all()
+    for session in sessions:
+        await discard_upload(session)
+        await db.delete(session)
+    await db.commit()
+    return len(sessions)
+
+
+async def expire_staging_objects() -> int:
+    """Delete direct uploads nobody can finalize any more, including re-PUTs after a finalize."""
+    deadline = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=UPLOAD_SESSION_TTL)
+    keys = [obj["Key"] for obj in await list_objects(STAGING_PREFIX) if obj["LastModified"] < deadline]
+    for start in range(0, len(keys), 1000):
+        await delete_objects(keys[start:start + 1000])
+    return len(keys)
+
+
+class UploadSweeper:
+    """Periodically expires abandoned resumable uploads so their parts do not stay in storage."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.task: Optional[asyncio.Task] = None
+        self.expired = 0
+
+    async def start(self) -> None:
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def sweep(self) -> None:
+        async with async_session_maker() as db:
+            while (expired := await expire_upload_sessions(db)) > 0:
+                self.expired += expired
+        self.expired += await expire_staging_objects()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("failed to expire upload sessions")
+
+
+upload_sweeper = UploadSweeper(UPLOAD_SWEEP_INTERVAL)
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import Counter
+from typing import Optional
+
+import redis
+
+from api.utils.ranking_utils import queue_rank_views
+from api.utils.redis_utils import RedisKeys
+from config import COMPACT_VIEWS, USER_VIEW_HISTORY_SIZE, VIEW_BUFFER_SIZE, VIEW_FLUSH_INTERVAL, VIEW_FLUSH_BATCH
+
+logger = logging.getLogger(__name__)
+
+
+# Commands queue_record_view adds per view; the first one reports whether the viewer is new.
+VIEW_COMMANDS = 3 if COMPACT_VIEWS else 2
+
+
+def queue_record_view(pipe, video_id: uuid.UUID, user_id) -> None:
+    if COMPACT_VIEWS:
+        history = RedisKeys.user_view_history(user_id)
+        pipe.pfadd(RedisKeys.video_views_hll(video_id), str(user_id))
+        pipe.zadd(history, {str(video_id): time.time()})
+        pipe.zremrangebyrank(history, 0, -USER_VIEW_HISTORY_SIZE - 1)
+    else:
+        pipe.sadd(RedisKeys.video_views(video_id), str(user_id))
+        pipe.sadd(RedisKeys.user_views(user_id), str(video_id))
+
+
+def queue_count_views(pipe, video_id: uuid.UUID) -> None:
+    if COMPACT_VIEWS:
+        pipe.pfcount(RedisKeys.video_views_hll(video_id))
+    else:
+        pipe.scard(RedisKeys.video_views(video_id))
+
+
+async def count_views(red: redis.Redis, video_id: uuid.UUID) -> int:
+    if COMPACT_VIEWS:
+        return await red.pfcount(RedisKeys.video_views_hll(video_id))
+    return await red.scard(RedisKeys.video_views(video_id))
+
+
+async def get_user_views(red: redis.Redis, user_id: uuid.UUID) -> list[str]:
+    """Video ids the user has viewed, most recent first when the capped history is used."""
+    if COMPACT_VIEWS:
+        return await red.zrevrange(RedisKeys.user_view_history(user_id), 0, -1)
+    return list(await red.smembers(RedisKeys.user_views(user_id)))
+
+
+async def forget_view(red: redis.Redis, user_id: uuid.UUID, video_id: uuid.UUID) -> None:
+    if COMPACT_VIEWS:
+        await red.zrem(RedisKeys.user_view_history(user_id), str(video_id))
+    else:
+        await red.srem(RedisKeys.user_views(user_id), str(video_id))
+
+
+def video_view_keys(video_id: uuid.UUID) -> list[str]:
+    return [RedisKeys.video_views(video_id), RedisKeys.video_views_hll(video_id)]
+
+
+class ViewBuffer:
+    """Collects view events in memory and writes them to Redis in pipelined batches off the request path."""
+
+    def __init__(self, maxsize: int, flush_interval: float, batch_size: int):
+        self.maxsize = maxsize
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.queue: Optional[asyncio.Queue] = None
+        self.red: Optional[redis.Redis] = None
+        self.task: Optional[asyncio.Task] = None
+        self.running = False
+        self.wakeup: Optional[asyncio.Event] = None
+        self.pushed = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+
+    async def start(self, red: redis.Redis) -> None:
+        self.red = red
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+        self.wakeup = asyncio.Event()
+        self.running = True
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush loop and drain whatever is still buffered."""
+        if self.task is None:
+            return
+        self.running = False
+        self.wakeup.set()
+        await self.task
+        await self.flush()
+        self.task = None
+
+    def push(self, video_id: uuid.UUID, user_id) -> None:
+        if not self.running:
+            self.dropped += 1
+            return
+        try:
+            self.queue.put_nowait((video_id, user_id))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return
+        self.pushed += 1
+        if self.queue.qsize() >= self.batch_size:
+            self.wakeup.set()
+
+    async def flush(self) -> None:
+        while not self.queue.empty():
+            batch = [self.queue.get_nowait() for _ in range(min(self.batch_size, self.queue.qsize()))]
+            try:
+                async with self.red.pipeline(transaction=False) as pipe:
+                    for video_id, user_id in batch:
+                        queue_record_view(pipe, video_id, user_id)
+                    results = await pipe.execute()
+                new_views = Counter(video_id for (video_id, _), added in zip(batch, results[::VIEW_COMMANDS])
+                                    if added)
+                if new_views:
+                    async with self.red.pipeline(transaction=False) as pipe:
+                        queue_rank_views(pipe, new_views)
+                        await pipe.execute()
+            except Exception:
+                self.failed += len(batch)
+                logger.exception("failed to flush %d view events", len(batch))
+                return
+            self.flushed += len(batch)
+
+    async def _run(self) -> None:
+        while self.running:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {"queued": self.queue.qsize() if self.queue is not None else 0,
+                "max_size": self.maxsize,
+                "pushed": self.pushed,
+                "flushed": self.flushed,
+                "dropped": self.dropped,
+                "failed": self.failed}
+
+
+view_buffer = ViewBuffer(VIEW_BUFFER_SIZE, VIEW_FLUSH_INTERVAL, VIEW_FLUSH_BATCH)
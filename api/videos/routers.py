@@ -2,7 +2,7 @@ import typing
 import uuid
 
 import sqlalchemy
-from fastapi import APIRouter, Depends, Request, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, Request, HTTPException, UploadFile, Query, Response
 import jwt
 from fastapi.params import Header
 from pydantic import Required
@@ -12,10 +12,19 @@ import redis
 from starlette import status
 
 from api.auth.routers import fastapi_users
-from api.common.schemes import pagination_params
-from api.utils.redis_utils import RedisKeys
-from api.utils.s3_utils import upload_video, upload_image
-from api.videos.schemes import Total, VideoModel, VideoUpdate, VideoList
+from api.common.schemes import pagination_params, paginate, next_cursor
+from api.utils.cache_utils import video_cache, feed_cache, etag_response
+from api.utils.comment_utils import forget_video_comments
+from api.utils.counter_utils import get_counter, change_counters, apply_counters, video_counter_names
+from api.utils.ranking_utils import get_top, get_trending, forget_video_rankings, like_ranking_keys, \
+    like_ranking_args, current_hour
+from api.utils.redis_utils import RedisKeys, TOGGLE_LIKE, TOGGLE_DISLIKE
+from api.utils.view_utils import view_buffer, forget_view, get_user_views, count_views, queue_count_views, \
+    video_view_keys
+from api.utils.preview_utils import enqueue_preview, delete_previews
+from api.utils.s3_utils import upload_video, upload_image, get_key
+from api.videos.schemes import Total, VideoModel, VideoUpdate, VideoList, VideoSearchResult, \
+    VideoRanking, RankedVideo
 from config import SECRET
 from db.models import User, Video
 from db.session import get_async_session, get_redis_async_session
@@ -27,6 +36,7 @@ videos_api = APIRouter(
 
 MAX_FILE_SIZE = 1024 * 1024 * 700  # 700mb
 MAX_IMAGE_SIZE = 1024 * 1024 * 10
+SEARCH_CONFIG = "russian"
 
 
 class MaxBodySizeException(Exception):
@@ -40,26 +50,90 @@ async def my_videos(
         db: AsyncSession = Depends(get_async_session),
         user: User = Depends(fastapi_users.current_user(active=True)),
         red: redis.Redis = Depends(get_redis_async_session)) -> VideoList:
-    res = await db.execute(select(Video).where(Video.owner_id == user.id)
-                           .offset(page_params["offset"]).limit(page_params["limit"]))
-    total = await db.execute(select(sqlalchemy.func.count()).select_from(Video).where(Video.owner_id == user.id)
-                             .offset(page_params["offset"]).limit(page_params["limit"]))
+    res = (await db.execute(paginate(select(Video).where(Video.owner_id == user.id),
+                                     page_params, Video.published_date, Video.id))).scalars().all()
+    total = await get_counter(RedisKeys.owner_videos_count(user.id), db, red)
 
-    return VideoList(videos=[await video_to_model_video(video, red) for video in res.scalars().all()],
-                     total=total.scalar())
+    return VideoList(videos=await videos_to_model_videos(res, red),
+                     total=total,
+                     next_cursor=next_cursor(res, page_params))
 
 
-@videos_api.get("/")
-async def get_videos(page_params: dict = Depends(pagination_params),
+@videos_api.get("/", response_model=VideoList)
+async def get_videos(request: Request,
+                     page_params: dict = Depends(pagination_params),
                      db: AsyncSession = Depends(get_async_session),
-                     red: redis.Redis = Depends(get_redis_async_session)) -> VideoList:
-    videos = (await db.execute(
-        select(Video).where(Video.is_private == False).offset(page_params["offset"]).limit(page_params["limit"])))
-    total = await db.execute(
-        select(sqlalchemy.func.count()).select_from(Video).where(Video.is_private == False).offset(
-            page_params["offset"]).limit(page_params["limit"]))
-    return VideoList(videos=[await video_to_model_video(video, red) for video in videos.scalars().all()],
-                     total=total.scalar())
+                     red: redis.Redis = Depends(get_redis_async_session)) -> Response:
+    """The public feed is the same for every caller, so pages are served from the shared micro-cache."""
+    async def build() -> str:
+        videos = (await db.execute(paginate(select(Video).where(Video.is_private == False),
+                                            page_params, Video.published_date, Video.id))).scalars().all()
+        total = await get_counter(RedisKeys.public_videos_count(), db, red)
+        return VideoList(videos=await videos_to_model_videos(videos, red),
+                         total=total,
+                         next_cursor=next_cursor(videos, page_params)).json()
+
+    page_key = f"{page_params['limit']}_{page_params['cursor'] or page_params['offset']}"
+    return etag_response(request, await feed_cache.get(page_key, red, build))
+
+
+@videos_api.get("/search")
+async def search_videos(q: str = Query(min_length=1, max_length=255),
+                        page_params: dict = Depends(pagination_params),
+                        db: AsyncSession = Depends(get_async_session),
+                        red: redis.Redis = Depends(get_redis_async_session)) -> VideoSearchResult:
+    """Full-text search over public videos, falling back to trigram similarity on the name when nothing matches."""
+    query = sqlalchemy.func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    rank = sqlalchemy.func.ts_rank_cd(Video.search_vector, query)
+    videos = (await db.execute(select(Video)
+                               .where(Video.is_private == False, Video.search_vector.op("@@")(query))
+                               .order_by(rank.desc(), Video.published_date.desc())
+                               .offset(page_params["offset"]).limit(page_params["limit"] + 1))).scalars().all()
+    fuzzy = False
+    if not videos and page_params["offset"] == 0:
+        fuzzy = True
+        videos = (await db.execute(select(Video)
+                                   .where(Video.is_private == False, Video.name.op("%")(q))
+                                   .order_by(sqlalchemy.func.similarity(Video.name, q).desc())
+                                   .limit(page_params["limit"]))).scalars().all()
+
+    more = len(videos) > page_params["limit"]
+    videos = videos[:page_params["limit"]]
+    return VideoSearchResult(videos=await videos_to_model_videos(videos, red),
+                             next_offset=page_params["offset"] + len(videos) if more else None,
+                             fuzzy=fuzzy)
+
+
+@videos_api.get("/top")
+async def top_videos(by: typing.Literal["views", "likes"] = "views",
+                     page_params: dict = Depends(pagination_params),
+                     db: AsyncSession = Depends(get_async_session),
+                     red: redis.Redis = Depends(get_redis_async_session)) -> VideoRanking:
+    """All-time most viewed or most liked public videos."""
+    ranked, total = await get_top(red, by, page_params["offset"], page_params["limit"])
+    return await build_ranking(ranked, total, page_params, db, red)
+
+
+@videos_api.get("/trending")
+async def trending_videos(page_params: dict = Depends(pagination_params),
+                          db: AsyncSession = Depends(get_async_session),
+                          red: redis.Redis = Depends(get_redis_async_session)) -> VideoRanking:
+    """Public videos ranked by recent views and likes, older activity weighted down hour by hour."""
+    ranked, total = await get_trending(red, page_params["offset"], page_params["limit"])
+    return await build_ranking(ranked, total, page_params, db, red)
+
+
+async def build_ranking(ranked: list[tuple[str, float]], total: int, page_params: dict,
+                        db: AsyncSession, red: redis.Redis) -> VideoRanking:
+    """Load the ranked ids in rank order; private videos are dropped, so a page may come back short."""
+    scores = dict(ranked)
+    res = sorted((await db.execute(select(Video).where(Video.id.in_(scores), Video.is_private == False)))
+                 .scalars().all(), key=lambda video: -scores[str(video.id)])
+    end = page_params["offset"] + len(ranked)
+    return VideoRanking(videos=[RankedVideo(**model.dict(), score=scores[str(model.id)])
+                                for model in await videos_to_model_videos(res, red)],
+                        total=total,
+                        next_offset=end if end < total else None)
 
 
 @videos_api.post("/", status_code=status.HTTP_201_CREATED)
@@ -75,10 +149,16 @@ async def add_video(request: Request,
         raise MaxBodySizeException(body_len=int(request.headers.get("Content-Length")))
 
     url = await upload_video(request, filename)
+    return await save_video(url, filename, user, db, red)
+
 
-    video = Video(url_video=url, owner_id=user.id, name=filename)
+async def save_video(url: str, name: str, user: User, db: AsyncSession, red: redis.Redis) -> VideoModel:
+    video = Video(url_video=url, owner_id=user.id, name=name, is_private=False)
     db.add(video)
+    counters = video_counter_names(user.id, is_private=False)
+    await change_counters(db, counters, 1)
     await db.commit()
+    await apply_counters(red, counters, 1)
     return await video_to_model_video(video, red)
 
 
@@ -87,16 +167,25 @@ async def delete_video(_id: uuid.UUID,
                        user: User = Depends(fastapi_users.current_user(active=True, verified=True)),
                        db: AsyncSession = Depends(get_async_session),
                        red: redis.Redis = Depends(get_redis_async_session)):
-    video = (await db.execute(select(Video).where(Video.id == _id))).scalar()
+    # locked like in update_video_info, so is_private cannot flip before the counters are changed
+    video = (await db.execute(select(Video).where(Video.id == _id).with_for_update())).scalar()
     if video is None:
         raise HTTPException(404)
     if video.owner_id != user.id:
         raise HTTPException(403)
-    await red.delete(RedisKeys.video_views(video.id))
+    await red.delete(*video_view_keys(video.id))
     await red.delete(RedisKeys.video_likes(video.id))
     await red.delete(RedisKeys.video_dislike(video.id))
+    await red.delete(RedisKeys.video_like_hours(video.id))
+    await forget_video_rankings(red, video.id)
+    await forget_video_comments(red, video.id)
+    counters = video_counter_names(video.owner_id, video.is_private)
+    await change_counters(db, counters, -1)
     await db.delete(video)
     await db.commit()
+    await apply_counters(red, counters, -1)
+    await video_cache.invalidate(_id, red)
+    await delete_previews(video.previews)
 
 
 @videos_api.patch("/{_id}")
@@ -105,27 +194,32 @@ async def update_video_info(_id: uuid.UUID,
                             db: AsyncSession = Depends(get_async_session),
                             red: redis.Redis = Depends(get_redis_async_session),
                             user: User = Depends(fastapi_users.current_user(active=True, verified=True))):
-    video: Video = (await db.execute(select(Video).where(Video.id == _id))).scalar()
+    video: Video = (await db.execute(select(Video).where(Video.id == _id).with_for_update())).scalar()
     if video is None:
         raise HTTPException(404)
 
     if video.owner_id != user.id:
         raise HTTPException(403)
 
+    counters, delta = [], 0
+    if video_update.is_private is not None and video_update.is_private != video.is_private:
+        counters, delta = [RedisKeys.public_videos_count()], -1 if video_update.is_private else 1
+        await change_counters(db, counters, delta)
+
     await db.execute(update(Video).where(Video.id == _id).values(**dict((filter(lambda t: t[1] is not None,
                                                                                 video_update.dict().items())))))
     await db.commit()
+    await apply_counters(red, counters, delta)
+    await video_cache.invalidate(_id, red)
 
-    print()
 
-
-@videos_api.get("/{_id}")
+@videos_api.get("/{_id}", response_model=VideoModel)
 async def get_video(_id: uuid.UUID,
                     request: Request,
                     db: AsyncSession = Depends(get_async_session),
-                    red: redis.Redis = Depends(get_redis_async_session)) -> VideoModel:
+                    red: redis.Redis = Depends(get_redis_async_session)) -> Response:
     auth_token = request.headers.get("Authorization")
-    video: Video = (await db.execute(select(Video).where(Video.id == _id))).scalar()
+    video = await video_cache.get(_id, db, red)
     if video is None:
         raise HTTPException(404)
 
@@ -137,22 +231,21 @@ async def get_video(_id: uuid.UUID,
         print(res)
         if video.is_private and uuid.UUID(res["sub"]) != video.owner_id:
             raise HTTPException(403)
-        await red.sadd(RedisKeys.video_views(video.id), res["sub"])
-        await red.sadd(RedisKeys.user_views(res["sub"]), str(video.id))
+        view_buffer.push(video.id, res["sub"])
 
-    return await video_to_model_video(video, red)
+    body = (await video_to_model_video(video, red)).json()
+    return etag_response(request, body, "private, no-cache" if video.is_private else "no-cache")
 
 
 @videos_api.post("/{_id}/like")
 async def like(_id: uuid.UUID, red: redis.Redis = Depends(get_redis_async_session),
                db: AsyncSession = Depends(get_async_session),
                user: User = Depends(fastapi_users.current_user(active=True))):
-    flag = (await db.execute(select(Video.id).where(Video.id == _id))).scalar()
-    if flag is None:
-        await red.srem(RedisKeys.user_views(user.id), str(_id))
+    if await video_cache.get(_id, db, red) is None:
+        await forget_view(red, user.id, _id)
         raise HTTPException(404)
-    await toggle_dislike(red, _id, user.id, remove=True)
-    return await toggle_like(red, _id, user.id)
+    likes, _ = await toggle_like(red, _id, user.id)
+    return likes
 
 
 @videos_api.get("/my/likes")
@@ -161,7 +254,7 @@ async def get_my_likes(red: redis.Redis = Depends(get_redis_async_session),
                        user: User = Depends(fastapi_users.current_user(active=True))) -> VideoList:
     likes = await red.smembers(RedisKeys.user_likes(user.id))
     res = (await db.execute(select(Video).where(Video.id.in_(likes)))).scalars().all()
-    return VideoList(videos=[await video_to_model_video(video, red) for video in res],
+    return VideoList(videos=await videos_to_model_videos(res, red),
                      total=len(likes))
 
 
@@ -169,9 +262,11 @@ async def get_my_likes(red: redis.Redis = Depends(get_redis_async_session),
 async def get_my_views(red: redis.Redis = Depends(get_redis_async_session),
                        db: AsyncSession = Depends(get_async_session),
                        user: User = Depends(fastapi_users.current_user(active=True))) -> VideoList:
-    views = await red.smembers(RedisKeys.user_views(user.id))
-    res = (await db.execute(select(Video).where(Video.id.in_(views)))).scalars().all()
-    return VideoList(videos=[await video_to_model_video(video, red) for video in res],
+    views = await get_user_views(red, user.id)
+    order = {video_id: i for i, video_id in enumerate(views)}
+    res = sorted((await db.execute(select(Video).where(Video.id.in_(views)))).scalars().all(),
+                 key=lambda video: order[str(video.id)])
+    return VideoList(videos=await videos_to_model_videos(res, red),
                      total=len(views))
 
 
@@ -180,13 +275,12 @@ async def dislike(_id: uuid.UUID,
                   red: redis.Redis = Depends(get_redis_async_session),
                   db: AsyncSession = Depends(get_async_session),
                   user: User = Depends(fastapi_users.current_user(active=True))):
-    flag = (await db.execute(select(Video.id).where(Video.id == _id))).scalar()
-    if flag is None:
-        await red.srem(RedisKeys.user_views(user.id), str(_id))
+    if await video_cache.get(_id, db, red) is None:
+        await forget_view(red, user.id, _id)
         raise HTTPException(404)
 
-    await toggle_like(red, _id, user.id, remove=True)
-    return await toggle_dislike(red, _id, user.id)
+    _, dislikes = await toggle_dislike(red, _id, user.id)
+    return dislikes
 
 
 @videos_api.get("/{_id}/like-and-dislike")
@@ -199,47 +293,67 @@ async def get_like_and_dislike(_id: uuid.UUID,
 @videos_api.post("/{_id}/preview")
 async def update_preview(_id: uuid.UUID, preview: UploadFile,
                          user: User = Depends(fastapi_users.current_user(active=True, verified=True)),
-                         db: AsyncSession = Depends(get_async_session)):
+                         db: AsyncSession = Depends(get_async_session),
+                         red: redis.Redis = Depends(get_redis_async_session)):
     if preview.content_type.split("/")[0] != "image":
         raise HTTPException(status_code=415, detail={"message": " supported only images"})
     if preview.size > MAX_IMAGE_SIZE:
         raise HTTPException(status_code=413, detail={"message": " supported only images"})
 
-    video: Video = (await db.execute(select(Video).where(Video.id == _id))).scalar()
+    video = await video_cache.get(_id, db, red)
     if video is None:
         raise HTTPException(404)
     if video.owner_id != user.id:
         raise HTTPException(403)
 
-    res = await upload_image(preview)
-    await db.execute(update(Video).where(Video.id == _id).values(preview=res))
+    key = get_key(preview.filename, "images/")
+    res = await upload_image(preview, key)
+    old_previews = (await db.execute(select(Video.previews).where(Video.id == _id).with_for_update())).scalar()
+    await db.execute(update(Video).where(Video.id == _id).values(preview=res, previews=None))
     await db.commit()
+    await video_cache.invalidate(_id, red)
+    await enqueue_preview(red, _id, key, res)
+    await delete_previews(old_previews)
+
 
+async def toggle_like(red: redis.Redis, id_video: uuid.UUID, id_user: uuid.UUID) -> tuple[int, int]:
+    hour = current_hour()
+    likes, dislikes = await TOGGLE_LIKE(red, like_script_keys(id_video, id_user, hour),
+                                        like_script_args(id_video, id_user, hour))
+    return likes, dislikes
 
-async def toggle_like(red: redis.Redis, id_video: uuid.UUID, id_user: uuid.UUID, remove=False):
-    key = RedisKeys.video_likes(id_video)
-    user_key = str(id_user)
-    if await red.sismember(key, user_key):
-        await red.srem(key, user_key)
-        await red.srem(RedisKeys.user_likes(id_user), str(id_video))
-    elif not remove:
-        await red.sadd(key, user_key)
-        await red.sadd(RedisKeys.user_likes(id_user), str(id_video))
 
-    return await red.scard(key)
+async def toggle_dislike(red: redis.Redis, id_video: uuid.UUID, id_user: uuid.UUID) -> tuple[int, int]:
+    hour = current_hour()
+    likes, dislikes = await TOGGLE_DISLIKE(red, like_script_keys(id_video, id_user, hour),
+                                           like_script_args(id_video, id_user, hour))
+    return likes, dislikes
 
 
-async def toggle_dislike(red: redis.Redis, id_video: uuid.UUID, id_user: uuid.UUID, remove=False):
-    key = RedisKeys.video_dislike(id_video)
-    user_key = str(id_user)
-    if await red.sismember(key, user_key):
-        await red.srem(key, user_key)
-    elif not remove:
-        await red.sadd(key, user_key)
-    return await red.scard(key)
+def like_script_keys(id_video: uuid.UUID, id_user: uuid.UUID, hour: int) -> list[str]:
+    return [RedisKeys.video_likes(id_video), RedisKeys.video_dislike(id_video), RedisKeys.user_likes(id_user),
+            *like_ranking_keys(id_video, hour)]
+
+
+def like_script_args(id_video: uuid.UUID, id_user: uuid.UUID, hour: int) -> list:
+    return [str(id_user), str(id_video), *like_ranking_args(hour)]
 
 
 async def video_to_model_video(video: Video, red: redis.Redis) -> VideoModel:
+    return build_video_model(video, await count_views(red, video.id))
+
+
+async def videos_to_model_videos(videos: typing.Sequence[Video], red: redis.Redis) -> list[VideoModel]:
+    if not videos:
+        return []
+    async with red.pipeline(transaction=False) as pipe:
+        for video in videos:
+            queue_count_views(pipe, video.id)
+        views = await pipe.execute()
+    return [build_video_model(video, count_view) for video, count_view in zip(videos, views)]
+
+
+def build_video_model(video: Video, count_view: int) -> VideoModel:
     return VideoModel(
         id=video.id,
         name=video.name,
@@ -247,9 +361,10 @@ async def video_to_model_video(video: Video, red: redis.Redis) -> VideoModel:
         description=video.description,
         is_private=video.is_private,
         preview=video.preview,
+        previews=video.previews,
         published_date=video.published_date,
         owner_id=video.owner_id,
-        count_view=await red.scard(RedisKeys.video_views(video.id))
+        count_view=count_view
     )
 
 
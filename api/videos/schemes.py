@@ -16,17 +16,35 @@ class VideoModel(BaseModel):
     description: Union[str, None]
     is_private: bool
     preview: Union[str, None]
+    previews: Optional[dict[str, str]] = None
     published_date: datetime.datetime
     owner_id: uuid.UUID
     count_view: int
 
 
+class RankedVideo(VideoModel):
+    score: float
+
+
 class VideoUpdate(BaseModel):
     name: str
     description: Optional[str]
     is_private: Optional[bool]
 
 
+class VideoSearchResult(BaseModel):
+    videos: list[VideoModel]
+    next_offset: Optional[int] = None
+    fuzzy: bool = False
+
+
 class VideoList(BaseModel):
     videos: list[VideoModel]
-    total: int
\ No newline at end of file
+    total: int
+    next_cursor: Optional[str] = None
+
+
+class VideoRanking(BaseModel):
+    videos: list[RankedVideo]
+    total: int
+    next_offset: Optional[int] = None
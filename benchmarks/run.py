@@ -0,0 +1,207 @@
+"""Drive the ASGI app through the hot endpoints and report latency percentiles and throughput.
+
+    python -m benchmarks.run [--scenarios feed,get_video,like,comments] [--requests 2000]
+                             [--concurrency 20] [--out results.json]
+    python -m benchmarks.run --compare old.json new.json
+
+Requests go through httpx straight into main.app (no network hop), with the app lifespan
+running, against whatever Postgres, Redis and S3 the config points at. Seed them first with
+benchmarks.seed. The upload scenario needs an S3 stand-in (MinIO/moto) via S3_ENDPOINT_URL.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import subprocess
+import time
+from typing import Awaitable, Callable
+
+import httpx
+from sqlalchemy import select, func
+
+from benchmarks.seed import SEED_PASSWORD, seed_email
+from db.models import Video, Comment
+from db.session import async_session_maker
+from main import app
+
+BASE = "/api/v1"
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+class Context:
+    def __init__(self, client: httpx.AsyncClient, tokens: list[str], video_ids: list[str],
+                 commented_ids: list[str], rng: random.Random, upload_size: int):
+        self.client = client
+        self.tokens = tokens
+        self.video_ids = video_ids
+        self.commented_ids = commented_ids
+        self.rng = rng
+        self.upload_size = upload_size
+        self.cursor = None
+
+    def auth(self) -> dict:
+        return {"Authorization": f"Bearer {self.rng.choice(self.tokens)}"}
+
+
+async def feed(ctx: Context) -> httpx.Response:
+    params = {"limit": 15}
+    if ctx.cursor is not None:
+        params["cursor"] = ctx.cursor
+    res = await ctx.client.get(f"{BASE}/videos/", params=params)
+    ctx.cursor = res.json().get("next_cursor") if res.status_code == 200 else None
+    return res
+
+
+async def feed_offset(ctx: Context) -> httpx.Response:
+    return await ctx.client.get(f"{BASE}/videos/", params={"offset": ctx.rng.randint(0, 5000), "limit": 15})
+
+
+async def get_video(ctx: Context) -> httpx.Response:
+    return await ctx.client.get(f"{BASE}/videos/{ctx.rng.choice(ctx.video_ids)}", headers=ctx.auth())
+
+
+async def like(ctx: Context) -> httpx.Response:
+    return await ctx.client.post(f"{BASE}/videos/{ctx.rng.choice(ctx.video_ids)}/like", headers=ctx.auth())
+
+
+async def comments(ctx: Context) -> httpx.Response:
+    return await ctx.client.get(f"{BASE}/comments/for_video/{ctx.rng.choice(ctx.commented_ids)}",
+                                params={"limit": 50})
+
+
+async def upload(ctx: Context) -> httpx.Response:
+    body = os.urandom(ctx.upload_size)
+    return await ctx.client.post(f"{BASE}/videos/", headers={**ctx.auth(), "filename": "bench.mp4",
+                                                              "types": "video/mp4"},
+                                 files={"file": ("bench.mp4", body, "video/mp4")})
+
+
+SCENARIOS: dict[str, Callable[[Context], Awaitable[httpx.Response]]] = {
+    "feed": feed,
+    "feed_offset": feed_offset,
+    "get_video": get_video,
+    "like": like,
+    "comments": comments,
+    "upload": upload,
+}
+
+
+async def run_scenario(ctx: Context, scenario, requests: int, concurrency: int) -> dict:
+    latencies, errors = [], 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                res = await scenario(ctx)
+                ok = res.status_code < 400
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {"requests": requests,
+            "errors": errors,
+            "elapsed": elapsed,
+            "throughput": requests / elapsed,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "max_ms": max(latencies) * 1000}
+
+
+async def login(client: httpx.AsyncClient, users: int) -> list[str]:
+    tokens = []
+    for i in range(users):
+        res = await client.post(f"{BASE}/auth/login", data={"username": seed_email(i), "password": SEED_PASSWORD})
+        res.raise_for_status()
+        tokens.append(res.json()["access_token"])
+    return tokens
+
+
+async def load_ids() -> tuple[list[str], list[str]]:
+    async with async_session_maker() as db:
+        video_ids = (await db.execute(select(Video.id).where(Video.is_private == False)
+                                      .order_by(func.random()).limit(1000))).scalars().all()
+        commented_ids = (await db.execute(select(Comment.video_id).group_by(Comment.video_id)
+                                          .order_by(func.count().desc()).limit(100))).scalars().all()
+    return [str(i) for i in video_ids], [str(i) for i in commented_ids]
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def main(args) -> dict:
+    rng = random.Random(args.seed)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            tokens = await login(client, args.users)
+            video_ids, commented_ids = await load_ids()
+            ctx = Context(client, tokens, video_ids, commented_ids, rng, args.upload_size)
+            results = {}
+            for name in args.scenarios.split(","):
+                requests = args.upload_requests if name == "upload" else args.requests
+                for _ in range(args.warmup):
+                    await SCENARIOS[name](ctx)
+                results[name] = await run_scenario(ctx, SCENARIOS[name], requests, args.concurrency)
+                print(f"{name:12} {results[name]['throughput']:9.1f} req/s  p50 {results[name]['p50_ms']:8.2f} ms"
+                      f"  p95 {results[name]['p95_ms']:8.2f} ms  p99 {results[name]['p99_ms']:8.2f} ms"
+                      f"  errors {results[name]['errors']}")
+    return {"revision": git_revision(),
+            "date": datetime.datetime.utcnow().isoformat(),
+            "config": {"requests": args.requests, "concurrency": args.concurrency, "seed": args.seed},
+            "results": results}
+
+
+def compare(old_path: str, new_path: str) -> None:
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['revision']} -> {new['revision']}")
+    for name, result in new["results"].items():
+        if name not in old["results"]:
+            continue
+        before = old["results"][name]
+        changes = "  ".join(f"{key} {before[key]:.2f} -> {result[key]:.2f} ({(result[key] / before[key] - 1) * 100:+.1f}%)"
+                            for key in ("throughput", "p50_ms", "p95_ms", "p99_ms") if before[key])
+        print(f"{name:12} {changes}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="feed,feed_offset,get_video,like,comments")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--upload-requests", type=int, default=20)
+    parser.add_argument("--upload-size", type=int, default=16 * 1024 * 1024)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--users", type=int, default=50, help="seeded users to log in as")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="write results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        report = asyncio.run(main(args))
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(report, f, indent=2)
@@ -0,0 +1,99 @@
+"""Fill a scratch database and Redis with generated users, videos, comments, likes and views.
+
+    python -m benchmarks.seed --users 1000 --videos 50000 --comments 200000 --likes 200000 --views 500000
+
+Rows go through the db.models mappings and Redis data through RedisKeys and view_utils, so
+the seeded data has the same shape the endpoints produce. Every user gets the password
+SEED_PASSWORD and an email user{i}@bench.local. Point the app config (.env / environment)
+at stand-ins first; see benchmarks/docker-compose.yaml.
+"""
+import argparse
+import asyncio
+import datetime
+import random
+import uuid
+
+from fastapi_users.password import PasswordHelper
+from sqlalchemy import insert
+
+from api.utils.counter_utils import rebuild_counters
+from api.utils.redis_utils import RedisKeys
+from api.utils.view_utils import queue_record_view
+from db.models import User, Video, Comment
+from db.session import async_session_maker, open_redis_pool, close_redis_pool
+
+SEED_PASSWORD = "benchmark"
+BATCH = 5000
+
+
+def seed_email(i: int) -> str:
+    return f"user{i}@bench.local"
+
+
+def batches(rows: list, size: int = BATCH):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def random_date(rng: random.Random) -> datetime.datetime:
+    return datetime.datetime.utcnow() - datetime.timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+
+
+async def seed(users: int, videos: int, comments: int, likes: int, views: int, private_share: float,
+               seed_value: int) -> None:
+    rng = random.Random(seed_value)
+    hashed_password = PasswordHelper().hash(SEED_PASSWORD)
+
+    user_rows = [{"id": uuid.uuid4(), "email": seed_email(i), "hashed_password": hashed_password,
+                  "is_active": True, "is_superuser": False, "is_verified": True, "username": f"user{i}",
+                  "register_date": random_date(rng)} for i in range(users)]
+    user_ids = [row["id"] for row in user_rows]
+    video_rows = [{"id": uuid.uuid4(), "name": f"video {i}", "url_video": f"videos/{i}.mp4",
+                   "description": f"generated video {i}", "is_private": rng.random() < private_share,
+                   "published_date": random_date(rng), "owner_id": rng.choice(user_ids)} for i in range(videos)]
+    video_ids = [row["id"] for row in video_rows]
+    # a few videos get most of the comments, like real popular threads
+    comment_rows = [{"id": uuid.uuid4(), "user_id": rng.choice(user_ids),
+                     "video_id": video_ids[int(rng.random() ** 3 * len(video_ids))],
+                     "text": f"comment {i}", "published_date": random_date(rng)} for i in range(comments)]
+
+    async with async_session_maker() as db:
+        for model, rows in ((User, user_rows), (Video, video_rows), (Comment, comment_rows)):
+            for batch in batches(rows):
+                await db.execute(insert(model), batch)
+            print(f"inserted {len(rows)} {model.__tablename__} rows")
+        await rebuild_counters(db)
+        await db.commit()
+
+    red = await open_redis_pool()
+    try:
+        for batch in batches(range(likes)):
+            async with red.pipeline(transaction=False) as pipe:
+                for _ in batch:
+                    video_id, user_id = rng.choice(video_ids), rng.choice(user_ids)
+                    pipe.sadd(RedisKeys.video_likes(video_id), str(user_id))
+                    pipe.sadd(RedisKeys.user_likes(user_id), str(video_id))
+                await pipe.execute()
+        print(f"recorded {likes} likes")
+        for batch in batches(range(views)):
+            async with red.pipeline(transaction=False) as pipe:
+                for _ in batch:
+                    queue_record_view(pipe, rng.choice(video_ids), rng.choice(user_ids))
+                await pipe.execute()
+        print(f"recorded {views} views")
+    finally:
+        await close_redis_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--videos", type=int, default=50000)
+    parser.add_argument("--comments", type=int, default=200000)
+    parser.add_argument("--likes", type=int, default=200000)
+    parser.add_argument("--views", type=int, default=500000)
+    parser.add_argument("--private-share", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=42, help="random seed, so runs are reproducible")
+    args = parser.parse_args()
+    asyncio.run(seed(args.users, args.videos, args.comments, args.likes, args.views, args.private_share,
+                     args.seed))
@@ -12,21 +12,75 @@ DB_PASS = os.environ.get("POSTGRES_PASSWORD")
 DB_HOST = os.environ.get("DB_HOST")
 DB_PORT = os.environ.get("DB_PORT")
 DB_NAME = os.environ.get("POSTGRES_DB")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", 500))
 
 REDIS_PORT = os.environ.get("REDIS_PORT")
 REDIS_HOST = os.environ.get("REDIS_HOST")
 REDIS_PASS = os.environ.get("REDIS_PASS")
+REDIS_MAX_CONNECTIONS = int(os.environ.get("REDIS_MAX_CONNECTIONS", 50))
+REDIS_POOL_TIMEOUT = float(os.environ.get("REDIS_POOL_TIMEOUT", 5))
+
+COMPACT_VIEWS = os.environ.get("COMPACT_VIEWS", "false").lower() == "true"
+USER_VIEW_HISTORY_SIZE = int(os.environ.get("USER_VIEW_HISTORY_SIZE", 500))
+VIEW_BUFFER_SIZE = int(os.environ.get("VIEW_BUFFER_SIZE", 10000))
+VIEW_FLUSH_INTERVAL = float(os.environ.get("VIEW_FLUSH_INTERVAL", 1))
+VIEW_FLUSH_BATCH = int(os.environ.get("VIEW_FLUSH_BATCH", 500))
+
+VIDEO_CACHE_SIZE = int(os.environ.get("VIDEO_CACHE_SIZE", 10000))
+VIDEO_CACHE_LOCAL_TTL = float(os.environ.get("VIDEO_CACHE_LOCAL_TTL", 5))
+VIDEO_CACHE_TTL = int(os.environ.get("VIDEO_CACHE_TTL", 300))
+
+TRENDING_WINDOW_HOURS = int(os.environ.get("TRENDING_WINDOW_HOURS", 24))
+TRENDING_DECAY = float(os.environ.get("TRENDING_DECAY", 0.9))
+TRENDING_REFRESH = int(os.environ.get("TRENDING_REFRESH", 60))
+TRENDING_VIEW_WEIGHT = float(os.environ.get("TRENDING_VIEW_WEIGHT", 1))
+TRENDING_LIKE_WEIGHT = float(os.environ.get("TRENDING_LIKE_WEIGHT", 5))
+
+FEED_CACHE_TTL = int(os.environ.get("FEED_CACHE_TTL", 2))
+FEED_CACHE_LOCK_TTL = int(os.environ.get("FEED_CACHE_LOCK_TTL", 5))
+FEED_CACHE_WAIT = float(os.environ.get("FEED_CACHE_WAIT", 1))
+
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", 30))
+USER_CACHE_REDIS = os.environ.get("USER_CACHE_REDIS", "false").lower() == "true"
 
 EMAIL_ADDRESS = os.environ.get("EMAIL_ADDRESS")
 EMAIL_PASS = os.environ.get("EMAIL_PASS")
+SMTP_HOST = os.environ.get("SMTP_HOST", "smtp.yandex.ru")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", 465))
+SMTP_USE_TLS = os.environ.get("SMTP_USE_TLS", "true").lower() == "true"
+MAIL_QUEUE_SIZE = int(os.environ.get("MAIL_QUEUE_SIZE", 1000))
+MAIL_BATCH_SIZE = int(os.environ.get("MAIL_BATCH_SIZE", 20))
+MAIL_MAX_ATTEMPTS = int(os.environ.get("MAIL_MAX_ATTEMPTS", 5))
+MAIL_RETRY_BACKOFF = float(os.environ.get("MAIL_RETRY_BACKOFF", 1))
+MAIL_IDLE_TIMEOUT = float(os.environ.get("MAIL_IDLE_TIMEOUT", 30))
+DEFAULT_LOCALE = os.environ.get("DEFAULT_LOCALE", "ru")
 
 ACCESS_KEY_ID = os.environ.get("ACCESS_KEY_ID")
 SECRET_ACCESS_KEY = os.environ.get("SECRET_ACCESS_KEY")
 BUCKET_NAME = os.environ.get("BUCKET_NAME")
+S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL", "https://storage.yandexcloud.net")
+S3_PART_SIZE = int(os.environ.get("S3_PART_SIZE", 8 * 1024 * 1024))
+S3_UPLOAD_CONCURRENCY = int(os.environ.get("S3_UPLOAD_CONCURRENCY", 4))
+S3_MAX_CONNECTIONS = int(os.environ.get("S3_MAX_CONNECTIONS", 50))
+S3_KEEPALIVE_TIMEOUT = float(os.environ.get("S3_KEEPALIVE_TIMEOUT", 60))
+UPLOAD_SESSION_TTL = int(os.environ.get("UPLOAD_SESSION_TTL", 60 * 60 * 24))
+UPLOAD_SWEEP_INTERVAL = float(os.environ.get("UPLOAD_SWEEP_INTERVAL", 600))
+PRESIGNED_URL_TTL = int(os.environ.get("PRESIGNED_URL_TTL", 60 * 60))
+
+PREVIEW_PROCESSES = int(os.environ.get("PREVIEW_PROCESSES", 1))
+PREVIEW_MAX_ATTEMPTS = int(os.environ.get("PREVIEW_MAX_ATTEMPTS", 3))
 
 APP_HOST = os.environ.get("APP_HOST")
 APP_PORT = os.environ.get("APP_PORT")
 
+REQUEST_CALLS_THRESHOLD = int(os.environ.get("REQUEST_CALLS_THRESHOLD", 20))
+
 
 if __name__ == "__main__":
     print(SECRET)
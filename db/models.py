@@ -4,6 +4,7 @@ import uuid
 import sqlalchemy as alchemy
 from fastapi_users_db_sqlalchemy import SQLAlchemyBaseUserTableUUID
 from sqlalchemy import ForeignKey
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import mapped_column, Mapped, DeclarativeBase, relationship
 
 
@@ -29,12 +30,27 @@ class Video(Base):
     description: Mapped[str] = mapped_column(alchemy.String(2047), nullable=True)
     is_private: Mapped[bool] = mapped_column(alchemy.Boolean, default=False)
     preview: Mapped[str] = mapped_column(alchemy.String, nullable=True)
+    previews: Mapped[dict] = mapped_column(alchemy.JSON, nullable=True)
     published_date: Mapped[datetime.datetime] = mapped_column(alchemy.TIMESTAMP, default=datetime.datetime.utcnow)
     owner_id: Mapped[uuid.UUID] = mapped_column(alchemy.UUID, ForeignKey("user.id"), nullable=False)
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR, alchemy.Computed("to_tsvector('russian', coalesce(name, '') || ' ' || coalesce(description, ''))",
+                                   persisted=True),
+        nullable=True, deferred=True)
 
     comments = relationship("Comment", back_populates="video", cascade="all, delete")
     user = relationship("User", back_populates="videos")
 
+    __table_args__ = (
+        alchemy.Index("ix_video_public_published", published_date.desc(), id.desc(),
+                      postgresql_where=~is_private),
+        alchemy.Index("ix_video_owner_published", owner_id, published_date.desc(), id.desc()),
+        alchemy.Index("ix_video_search_vector", search_vector, postgresql_using="gin",
+                      postgresql_where=~is_private),
+        alchemy.Index("ix_video_name_trgm", name, postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"},
+                      postgresql_where=~is_private),
+    )
+
 class Comment(Base):
     __tablename__ = "comment"
     id: Mapped[uuid.UUID] = mapped_column(alchemy.UUID, primary_key=True, default=uuid.uuid4)
@@ -47,3 +63,26 @@ class Comment(Base):
 
     user = relationship("User", back_populates="comments")
     video = relationship("Video", back_populates="comments")
+
+    __table_args__ = (
+        alchemy.Index("ix_comment_video_published", video_id, published_date.desc(), id.desc()),
+        alchemy.Index("ix_comment_user_id", user_id),
+    )
+
+
+class VideoCounter(Base):
+    __tablename__ = "video_counter"
+    name: Mapped[str] = mapped_column(alchemy.String(127), primary_key=True)
+    value: Mapped[int] = mapped_column(alchemy.BigInteger, nullable=False, default=0)
+
+
+class UploadSession(Base):
+    __tablename__ = "upload_session"
+    id: Mapped[uuid.UUID] = mapped_column(alchemy.UUID, primary_key=True, default=uuid.uuid4)
+    owner_id: Mapped[uuid.UUID] = mapped_column(alchemy.UUID, ForeignKey("user.id", ondelete="CASCADE"),
+                                                nullable=False)
+    name: Mapped[str] = mapped_column(alchemy.String, nullable=False)
+    key: Mapped[str] = mapped_column(alchemy.String, nullable=False)
+    s3_upload_id: Mapped[str] = mapped_column(alchemy.String, nullable=False)
+    size: Mapped[int] = mapped_column(alchemy.BigInteger, nullable=False)
+    created_date: Mapped[datetime.datetime] = mapped_column(alchemy.TIMESTAMP, default=datetime.datetime.utcnow)
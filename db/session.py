@@ -1,24 +1,139 @@
-from typing import AsyncGenerator
+import time
+from typing import AsyncGenerator, Optional, Callable
 import redis.asyncio
 import redis
 from fastapi import Depends
 from fastapi_users.db import SQLAlchemyUserDatabase
+from sqlalchemy import exc
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from db.models import User
-from config import DB_USER, DB_PASS, DB_HOST, DB_PORT, DB_NAME, REDIS_HOST, REDIS_PASS, REDIS_PORT
+from config import DB_USER, DB_PASS, DB_HOST, DB_PORT, DB_NAME, REDIS_HOST, REDIS_PASS, REDIS_PORT, \
+    REDIS_MAX_CONNECTIONS, REDIS_POOL_TIMEOUT, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, \
+    DB_POOL_PRE_PING, DB_STATEMENT_CACHE_SIZE
 
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-redis_session = redis.asyncio.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, password=REDIS_PASS, decode_responses=True)
 
-engine = create_async_engine(DATABASE_URL)
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records checkout wait time and how often callers hit the overflow limit."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.checkout_timeouts += 1
+            raise
+        waited = time.perf_counter() - start
+        self.checkouts += 1
+        self.wait_time_total += waited
+        self.wait_time_max = max(self.wait_time_max, waited)
+        return connection
+
+    def stats(self) -> dict:
+        return {"pool_size": self.size(),
+                "max_overflow": self._max_overflow,
+                "checked_out": self.checkedout(),
+                "checked_in": self.checkedin(),
+                "overflow": self.overflow(),
+                "saturation": self.checkedout() / (self.size() + max(self._max_overflow, 0)),
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.checkout_timeouts,
+                "wait_time_total": self.wait_time_total,
+                "wait_time_max": self.wait_time_max}
+
+
+engine = create_async_engine(f"{DATABASE_URL}?prepared_statement_cache_size={DB_STATEMENT_CACHE_SIZE}",
+                             poolclass=InstrumentedQueuePool,
+                             pool_size=DB_POOL_SIZE,
+                             max_overflow=DB_MAX_OVERFLOW,
+                             pool_timeout=DB_POOL_TIMEOUT,
+                             pool_recycle=DB_POOL_RECYCLE,
+                             pool_pre_ping=DB_POOL_PRE_PING)
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
 
+class InstrumentedConnectionPool(redis.asyncio.BlockingConnectionPool):
+    """Blocking pool that keeps track of connections in use and time spent waiting for one."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.listeners: list[Callable[[float], None]] = []
+        self.checked_out: dict = {}
+        self.created = 0
+        self.in_use = 0
+        self.checkouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def make_connection(self):
+        self.created += 1
+        return super().make_connection()
+
+    async def get_connection(self, command_name, *keys, **options):
+        start = time.perf_counter()
+        connection = await super().get_connection(command_name, *keys, **options)
+        waited = time.perf_counter() - start
+        self.in_use += 1
+        self.checkouts += 1
+        self.wait_time_total += waited
+        self.wait_time_max = max(self.wait_time_max, waited)
+        self.checked_out[connection] = time.perf_counter()
+        return connection
+
+    async def release(self, connection):
+        await super().release(connection)
+        # the parent releases connections that failed to connect before get_connection counted them
+        checked_out = self.checked_out.pop(connection, None)
+        if checked_out is None:
+            return
+        self.in_use -= 1
+        # one checkout is one command or one pipeline, i.e. one round trip
+        held = time.perf_counter() - checked_out
+        for listener in self.listeners:
+            listener(held)
+
+    def stats(self) -> dict:
+        return {"max_connections": self.max_connections,
+                "created": self.created,
+                "in_use": self.in_use,
+                "idle": self.created - self.in_use,
+                "checkouts": self.checkouts,
+                "wait_time_total": self.wait_time_total,
+                "wait_time_max": self.wait_time_max}
+
+
+redis_pool: Optional[InstrumentedConnectionPool] = None
+redis_session: Optional[redis.asyncio.StrictRedis] = None
+
+
+async def open_redis_pool() -> redis.asyncio.StrictRedis:
+    global redis_pool, redis_session
+    redis_pool = InstrumentedConnectionPool(host=REDIS_HOST, port=REDIS_PORT, password=REDIS_PASS,
+                                            decode_responses=True, max_connections=REDIS_MAX_CONNECTIONS,
+                                            timeout=REDIS_POOL_TIMEOUT)
+    redis_session = redis.asyncio.StrictRedis(connection_pool=redis_pool)
+    return redis_session
+
+
+async def close_redis_pool() -> None:
+    global redis_pool, redis_session
+    if redis_session is not None:
+        await redis_session.close()
+        await redis_pool.disconnect()
+    redis_pool = redis_session = None
+
+
 async def get_redis_async_session() -> AsyncGenerator[redis.Redis, None]:
-    async with redis.asyncio.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, password=REDIS_PASS,
-                                         decode_responses=True) as session:
-        yield session
+    yield redis_session
 
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
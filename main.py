@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI,APIRouter
 from starlette.middleware.cors import CORSMiddleware
@@ -5,11 +6,42 @@ from starlette.middleware.cors import CORSMiddleware
 
 from api.auth.routers import auth_api
 from api.comments.routers import comments_api
+from api.metrics.middleware import MetricsMiddleware
+from api.metrics.routers import metrics_api
+from api.metrics.stats import instrument_engine, record_redis_call
+from api.uploads.routers import uploads_api
 from api.users.routers import users_api
 from api.videos.routers import videos_api
+from api.utils.message_utils import mail_queue, mail_templates
+from api.utils.preview_utils import preview_worker
+from api.utils.s3_utils import open_s3_client, close_s3_client
+from api.utils.upload_utils import upload_sweeper
+from api.utils.view_utils import view_buffer
+from db import session
+from db.session import open_redis_pool, close_redis_pool
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    red = await open_redis_pool()
+    session.redis_pool.listeners.append(record_redis_call)
+    await view_buffer.start(red)
+    await open_s3_client()
+    await preview_worker.start(red)
+    await upload_sweeper.start()
+    mail_templates.load()
+    await mail_queue.start()
+    yield
+    await mail_queue.stop()
+    await upload_sweeper.stop()
+    await preview_worker.stop()
+    await close_s3_client()
+    await view_buffer.stop()
+    await close_redis_pool()
+
+
+app = FastAPI(lifespan=lifespan)
+instrument_engine(session.engine)
 
 
 origins = [
@@ -22,14 +54,18 @@ app.add_middleware(
     allow_origins=origins,
     allow_methods=["GET", "POST", "OPTIONS", "DELETE", "PATCH", "PUT", "HEAD"],
     allow_headers=["Content-Type", "Set-Cookie", "Access-Control-Allow-Headers", "Access-Control-Allow-Origin",
-                   "Authorization", "filename", "types"],
+                   "Authorization", "filename", "types", "Content-MD5"],
 )
 
+app.add_middleware(MetricsMiddleware)
+
 api_v1 = APIRouter(prefix="/api/v1", tags=["v1"])
 api_v1.include_router(auth_api)
 api_v1.include_router(videos_api)
+api_v1.include_router(uploads_api)
 api_v1.include_router(users_api)
 api_v1.include_router(comments_api)
+api_v1.include_router(metrics_api)
 
 app.include_router(api_v1, prefix="")
 
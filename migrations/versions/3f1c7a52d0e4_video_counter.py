@@ -0,0 +1,37 @@
+"""video counter
+
+Revision ID: 3f1c7a52d0e4
+Revises: 96aca3a9880b
+Create Date: 2026-10-18 12:04:11.532817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c7a52d0e4'
+down_revision = '96aca3a9880b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('video_counter',
+    sa.Column('name', sa.String(length=127), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    # names must match RedisKeys.public_videos_count / RedisKeys.owner_videos_count
+    op.execute("""
+        INSERT INTO video_counter (name, value)
+        SELECT 'public_videos_count', count(*) FROM video WHERE NOT is_private
+    """)
+    op.execute("""
+        INSERT INTO video_counter (name, value)
+        SELECT 'owner_' || owner_id || '_videos_count', count(*) FROM video GROUP BY owner_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('video_counter')
@@ -0,0 +1,24 @@
+"""video previews
+
+Revision ID: 5b0e93c1f7a2
+Revises: a81d4e6c2b97
+Create Date: 2026-10-18 15:48:02.604519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b0e93c1f7a2'
+down_revision = 'a81d4e6c2b97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('video', sa.Column('previews', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('video', 'previews')
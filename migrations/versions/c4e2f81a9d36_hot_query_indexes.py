@@ -0,0 +1,39 @@
+"""hot query indexes
+
+Revision ID: c4e2f81a9d36
+Revises: 5b0e93c1f7a2
+Create Date: 2026-10-18 17:10:54.381906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e2f81a9d36'
+down_revision = '5b0e93c1f7a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index('ix_video_public_published', 'video',
+                        [sa.text('published_date DESC'), sa.text('id DESC')],
+                        postgresql_where=sa.text('NOT is_private'), postgresql_concurrently=True)
+        op.create_index('ix_video_owner_published', 'video',
+                        ['owner_id', sa.text('published_date DESC'), sa.text('id DESC')],
+                        postgresql_concurrently=True)
+        op.create_index('ix_comment_video_published', 'comment',
+                        ['video_id', sa.text('published_date DESC'), sa.text('id DESC')],
+                        postgresql_concurrently=True)
+        op.create_index('ix_comment_user_id', 'comment', ['user_id'], postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_comment_user_id', table_name='comment', postgresql_concurrently=True)
+        op.drop_index('ix_comment_video_published', table_name='comment', postgresql_concurrently=True)
+        op.drop_index('ix_video_owner_published', table_name='video', postgresql_concurrently=True)
+        op.drop_index('ix_video_public_published', table_name='video', postgresql_concurrently=True)
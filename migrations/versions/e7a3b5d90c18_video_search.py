@@ -0,0 +1,39 @@
+"""video search
+
+Revision ID: e7a3b5d90c18
+Revises: c4e2f81a9d36
+Create Date: 2026-10-18 18:32:19.770245
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3b5d90c18'
+down_revision = 'c4e2f81a9d36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.add_column('video', sa.Column(
+        'search_vector', postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('russian', coalesce(name, '') || ' ' || coalesce(description, ''))",
+                    persisted=True),
+        nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_video_search_vector', 'video', ['search_vector'], postgresql_using='gin',
+                        postgresql_where=sa.text('NOT is_private'), postgresql_concurrently=True)
+        op.create_index('ix_video_name_trgm', 'video', ['name'], postgresql_using='gin',
+                        postgresql_ops={'name': 'gin_trgm_ops'},
+                        postgresql_where=sa.text('NOT is_private'), postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_video_name_trgm', table_name='video', postgresql_concurrently=True)
+        op.drop_index('ix_video_search_vector', table_name='video', postgresql_concurrently=True)
+    op.drop_column('video', 'search_vector')
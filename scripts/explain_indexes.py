@@ -0,0 +1,109 @@
+"""Print query plans for the hot video/comment queries with and without the c4e2f81a9d36 indexes.
+
+    python -m scripts.explain_indexes [--seed] [--users 1000] [--videos 200000] [--comments 1000000]
+
+Run it against a scratch database with migrations applied. --seed fills it with generated rows
+first. The "before" plans are taken inside a transaction that drops the indexes and is then
+rolled back, so the schema is left untouched.
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncConnection
+
+from db.session import DATABASE_URL
+
+INDEXES = ["ix_video_public_published", "ix_video_owner_published", "ix_comment_video_published",
+           "ix_comment_user_id"]
+
+QUERIES = {
+    "get_videos": """
+        SELECT * FROM video WHERE is_private = false
+        ORDER BY published_date DESC, id DESC LIMIT 15 OFFSET 5000""",
+    "get_videos (cursor)": """
+        SELECT * FROM video WHERE is_private = false
+          AND (published_date, id) < (:cursor_date, :cursor_id)
+        ORDER BY published_date DESC, id DESC LIMIT 15""",
+    "my_videos": """
+        SELECT * FROM video WHERE owner_id = :owner_id
+        ORDER BY published_date DESC, id DESC LIMIT 15""",
+    "get_comments": """
+        SELECT comment.*, "user".username FROM comment JOIN "user" ON "user".id = comment.user_id
+        WHERE comment.video_id = :video_id
+        ORDER BY comment.published_date DESC, comment.id DESC LIMIT 15""",
+}
+
+SEED = [
+    """INSERT INTO "user" (id, username, register_date, email, hashed_password, is_active, is_superuser,
+                           is_verified)
+       SELECT gen_random_uuid(), 'user' || i, now(), 'user' || i || '@example.com', '', true, false, true
+       FROM generate_series(1, :users) i""",
+    """INSERT INTO video (id, name, url_video, is_private, published_date, owner_id)
+       SELECT gen_random_uuid(), 'video' || i, 'videos/' || i, random() < 0.1,
+              now() - random() * interval '365 days', owners.ids[1 + (i % array_length(owners.ids, 1))]
+       FROM generate_series(1, :videos) i, (SELECT array_agg(id) ids FROM "user") owners""",
+    """INSERT INTO comment (id, user_id, video_id, text, published_date)
+       SELECT gen_random_uuid(), users.ids[1 + (i % array_length(users.ids, 1))],
+              videos.ids[1 + (floor(power(random(), 3) * array_length(videos.ids, 1)))::int],
+              'comment ' || i, now() - random() * interval '365 days'
+       FROM generate_series(1, :comments) i,
+            (SELECT array_agg(id) ids FROM "user") users,
+            (SELECT array_agg(id) ids FROM video) videos""",
+    "ANALYZE",
+]
+
+
+async def seed(conn: AsyncConnection, users: int, videos: int, comments: int) -> None:
+    params = {"users": users, "videos": videos, "comments": comments}
+    for stmt in SEED:
+        await conn.execute(text(stmt), params)
+    await conn.commit()
+
+
+async def explain_all(conn: AsyncConnection, params: dict) -> None:
+    for name, query in QUERIES.items():
+        plan = await conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {query}"), params)
+        print(f"--- {name}")
+        print("\n".join(row[0] for row in plan))
+
+
+async def main(args) -> None:
+    engine = create_async_engine(DATABASE_URL)
+    async with engine.connect() as conn:
+        if args.seed:
+            await seed(conn, args.users, args.videos, args.comments)
+        # the cursor a client would hold after paging 5000 rows in, fetched once so the plan shows only
+        # the keyset comparison
+        cursor_date, cursor_id = (await conn.execute(text(
+            "SELECT published_date, id FROM video WHERE NOT is_private "
+            "ORDER BY published_date DESC, id DESC OFFSET 5000 LIMIT 1"))).one()
+        params = {
+            "cursor_date": cursor_date,
+            "cursor_id": cursor_id,
+            "owner_id": (await conn.execute(text(
+                "SELECT owner_id FROM video GROUP BY owner_id ORDER BY count(*) DESC LIMIT 1"))).scalar(),
+            "video_id": (await conn.execute(text(
+                "SELECT video_id FROM comment GROUP BY video_id ORDER BY count(*) DESC LIMIT 1"))).scalar(),
+        }
+        await conn.commit()
+
+        print("===== before (indexes dropped inside a rolled back transaction)")
+        for index in INDEXES:
+            await conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+        await explain_all(conn, params)
+        await conn.rollback()
+
+        print("===== after")
+        await explain_all(conn, params)
+        await conn.rollback()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", action="store_true")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--videos", type=int, default=200000)
+    parser.add_argument("--comments", type=int, default=1000000)
+    asyncio.run(main(parser.parse_args()))
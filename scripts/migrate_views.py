@@ -0,0 +1,74 @@
+"""Copy view sets into the compact layout used with COMPACT_VIEWS=true.
+
+    python -m scripts.migrate_views [--delete] [--batch 1000]
+
+video_{id}_views sets become HyperLogLogs and user_{id}_views sets become capped
+sorted sets. Set members carry no timestamps, so migrated history entries all
+get the migration time as their score.
+"""
+import argparse
+import asyncio
+import time
+
+import redis.asyncio
+
+from api.utils.redis_utils import RedisKeys
+from config import REDIS_HOST, REDIS_PORT, REDIS_PASS, USER_VIEW_HISTORY_SIZE
+
+
+def key_id(key: str) -> str:
+    return key.split("_")[1]
+
+
+async def migrate_video_views(red: redis.asyncio.Redis, batch: int, delete: bool) -> int:
+    migrated = 0
+    async for key in red.scan_iter(match="video_*_views", count=batch, _type="set"):
+        target = RedisKeys.video_views_hll(key_id(key))
+        members = []
+        async for member in red.sscan_iter(key, count=batch):
+            members.append(member)
+            if len(members) >= batch:
+                await red.pfadd(target, *members)
+                members = []
+        if members:
+            await red.pfadd(target, *members)
+        if delete:
+            await red.unlink(key)
+        migrated += 1
+    return migrated
+
+
+async def migrate_user_views(red: redis.asyncio.Redis, batch: int, delete: bool) -> int:
+    migrated = 0
+    now = time.time()
+    async for key in red.scan_iter(match="user_*_views", count=batch, _type="set"):
+        target = RedisKeys.user_view_history(key_id(key))
+        members = {}
+        async for member in red.sscan_iter(key, count=batch):
+            members[member] = now
+            if len(members) >= batch:
+                await red.zadd(target, members, nx=True)
+                members = {}
+        if members:
+            await red.zadd(target, members, nx=True)
+        await red.zremrangebyrank(target, 0, -USER_VIEW_HISTORY_SIZE - 1)
+        if delete:
+            await red.unlink(key)
+        migrated += 1
+    return migrated
+
+
+async def main(batch: int, delete: bool) -> None:
+    async with redis.asyncio.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, password=REDIS_PASS,
+                                         decode_responses=True) as red:
+        videos = await migrate_video_views(red, batch, delete)
+        users = await migrate_user_views(red, batch, delete)
+    print(f"migrated {videos} video view sets and {users} user view sets")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--delete", action="store_true", help="unlink the source sets once copied")
+    args = parser.parse_args()
+    asyncio.run(main(args.batch, args.delete))
@@ -0,0 +1,82 @@
+"""Rebuild the all-time top videos sorted sets from the per-video like and view keys,
+and the per-video comment score sets from the comment table and its reaction sets.
+
+    python -m scripts.rebuild_rankings [--batch 1000]
+
+Run once after deploying the rankings and whenever the sets drift. Trending buckets
+only cover recent activity and are not rebuilt.
+"""
+import argparse
+import asyncio
+
+import redis.asyncio
+from sqlalchemy import select
+
+from api.utils.comment_utils import count_reactions
+from api.utils.redis_utils import RedisKeys
+from config import REDIS_HOST, REDIS_PORT, REDIS_PASS, COMPACT_VIEWS
+from db.models import Comment
+from db.session import async_session_maker
+
+
+def key_id(key: str) -> str:
+    return key.split("_")[1]
+
+
+async def rebuild(red: redis.asyncio.Redis, pattern: str, _type: str, metric: str, batch: int) -> int:
+    target = RedisKeys.top_videos(metric)
+    count = 0
+    keys = []
+    async for key in red.scan_iter(match=pattern, count=batch, _type=_type):
+        keys.append(key)
+        if len(keys) >= batch:
+            count += await store_scores(red, target, keys, _type)
+            keys = []
+    if keys:
+        count += await store_scores(red, target, keys, _type)
+    return count
+
+
+async def store_scores(red: redis.asyncio.Redis, target: str, keys: list[str], _type: str) -> int:
+    async with red.pipeline(transaction=False) as pipe:
+        for key in keys:
+            if _type == "set":
+                pipe.scard(key)
+            else:
+                pipe.pfcount(key)
+        scores = await pipe.execute()
+    await red.zadd(target, {key_id(key): score for key, score in zip(keys, scores)})
+    return len(keys)
+
+
+async def rebuild_comment_scores(red: redis.asyncio.Redis, batch: int) -> int:
+    count = 0
+    async with async_session_maker() as db:
+        result = await db.stream(select(Comment.id, Comment.video_id).execution_options(yield_per=batch))
+        async for rows in result.partitions(batch):
+            reactions = await count_reactions(red, [comment_id for comment_id, _ in rows])
+            async with red.pipeline(transaction=False) as pipe:
+                for (comment_id, video_id), (likes, dislikes) in zip(rows, reactions):
+                    pipe.zadd(RedisKeys.video_comment_scores(video_id), {str(comment_id): likes - dislikes})
+                await pipe.execute()
+            count += len(rows)
+    return count
+
+
+async def main(batch: int) -> None:
+    async with redis.asyncio.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, password=REDIS_PASS,
+                                         decode_responses=True) as red:
+        likes = await rebuild(red, "video_*_likes", "set", "likes", batch)
+        if COMPACT_VIEWS:
+            views = await rebuild(red, "video_*_views_hll", "string", "views", batch)
+        else:
+            views = await rebuild(red, "video_*_views", "set", "views", batch)
+        comments = await rebuild_comment_scores(red, batch)
+    print(f"ranked {likes} videos by likes, {views} videos by views and {comments} comments")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main(args.batch))
@@ -0,0 +1,81 @@
+"""Test settings are set before any app module reads config.
+
+S3 goes to an in-process moto server, Redis to fakeredis and SMTP to an aiosmtpd controller,
+so the suite needs no running services:
+
+    pip install -r tests/requirements.txt
+    python -m pytest tests
+"""
+import os
+import socket
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+S3_PORT = free_port()
+SMTP_PORT = free_port()
+
+os.environ.update({
+    "SECRET": "test",
+    "DB_PORT": "5432",
+    "S3_ENDPOINT_URL": f"http://127.0.0.1:{S3_PORT}",
+    "ACCESS_KEY_ID": "test",
+    "SECRET_ACCESS_KEY": "test",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "BUCKET_NAME": "test-bucket",
+    "S3_PART_SIZE": str(5 * 1024 * 1024),
+    "SMTP_HOST": "127.0.0.1",
+    "SMTP_PORT": str(SMTP_PORT),
+    "SMTP_USE_TLS": "false",
+    "EMAIL_ADDRESS": "noreply@example.com",
+    "EMAIL_PASS": "",
+})
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def s3_server():
+    from moto.server import ThreadedMotoServer
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=S3_PORT, verbose=False)
+    server.start()
+    yield os.environ["S3_ENDPOINT_URL"]
+    server.stop()
+
+
+class SMTPHandler:
+    """Records delivered messages with the connection they came on; can refuse the first attempts."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self, refuse: int = 0) -> None:
+        self.messages = []
+        self.refuse = refuse
+        self.refused = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.refused < self.refuse:
+            self.refused += 1
+            return "451 Try again later"
+        self.messages.append((id(session), envelope.rcpt_tos[0]))
+        return "250 OK"
+
+
+@pytest.fixture(scope="session")
+def smtp_controller():
+    from aiosmtpd.controller import Controller
+    controller = Controller(SMTPHandler(), hostname="127.0.0.1", port=SMTP_PORT)
+    controller.start()
+    yield controller
+    controller.stop()
+
+
+@pytest.fixture
+def smtp(smtp_controller) -> SMTPHandler:
+    smtp_controller.handler.reset()
+    return smtp_controller.handler
@@ -0,0 +1,81 @@
+import asyncio
+
+from api.utils.message_utils import MailQueue, build_message
+
+
+def make_queue(max_attempts: int = 3) -> MailQueue:
+    return MailQueue(maxsize=100, batch_size=20, max_attempts=max_attempts, backoff=0.01, idle_timeout=5)
+
+
+def message(number: int):
+    return build_message("subject", f"body {number}", f"user{number}@example.com")
+
+
+async def wait_for(condition, timeout: float = 5) -> None:
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+def test_batch_is_sent_on_one_connection(smtp):
+    async def scenario():
+        queue = make_queue()
+        await queue.start()
+        for number in range(5):
+            queue.push(message(number))
+        await wait_for(lambda: queue.sent == 5)
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert [rcpt for _, rcpt in smtp.messages] == [f"user{number}@example.com" for number in range(5)]
+    assert len({session for session, _ in smtp.messages}) == 1
+
+
+def test_failed_message_is_retried_with_backoff(smtp):
+    smtp.reset(refuse=2)
+
+    async def scenario():
+        queue = make_queue(max_attempts=3)
+        await queue.start()
+        queue.push(message(1))
+        await wait_for(lambda: queue.sent == 1)
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert queue.retried == 2
+    assert queue.failed == 0
+    assert [rcpt for _, rcpt in smtp.messages] == ["user1@example.com"]
+
+
+def test_message_is_dropped_after_max_attempts(smtp):
+    smtp.reset(refuse=10)
+
+    async def scenario():
+        queue = make_queue(max_attempts=3)
+        await queue.start()
+        queue.push(message(1))
+        await wait_for(lambda: queue.failed == 1)
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert smtp.refused == 3
+    assert queue.retried == 2
+    assert smtp.messages == []
+
+
+def test_stop_drains_the_queue(smtp):
+    async def scenario():
+        queue = make_queue()
+        await queue.start()
+        for number in range(30):
+            queue.push(message(number))
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert queue.sent == 30
+    assert len(smtp.messages) == 30
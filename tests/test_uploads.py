@@ -0,0 +1,253 @@
+import asyncio
+import base64
+import datetime
+import hashlib
+import uuid
+
+import aiohttp
+import fakeredis.aioredis
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.types import UUID
+from starlette.requests import Request
+
+from api.uploads import routers
+from api.uploads.schemes import UploadCreate
+from api.utils import s3_utils, upload_utils
+from api.utils.upload_utils import expire_upload_sessions, STAGING_PREFIX
+from config import S3_PART_SIZE, BUCKET_NAME, UPLOAD_SESSION_TTL
+from db.models import User, UploadSession
+
+SIZE = 2 * S3_PART_SIZE + 100
+DATA = bytes(range(256)) * (SIZE // 256) + bytes(SIZE % 256)
+
+
+@compiles(UUID, "sqlite")
+def compile_uuid(element, compiler, **kw):
+    # upload sessions live in in-memory SQLite here; the app only targets Postgres
+    return "CHAR(32)"
+
+
+def md5(body: bytes) -> str:
+    return base64.b64encode(hashlib.md5(body).digest()).decode()
+
+
+def part(number: int) -> bytes:
+    return DATA[(number - 1) * S3_PART_SIZE:number * S3_PART_SIZE]
+
+
+def make_request(body: bytes, content_length: bool = True) -> Request:
+    headers = [(b"content-length", str(len(body)).encode())] if content_length else []
+    chunks = [body[i:i + 65536] for i in range(0, len(body), 65536)] or [b""]
+
+    async def receive():
+        chunk = chunks.pop(0)
+        return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+
+    return Request({"type": "http", "method": "PUT", "headers": headers}, receive)
+
+
+async def saved_video(url, name, user, db, red):
+    await db.commit()
+    return {"url": url, "name": name}
+
+
+class Env:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.red = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        self.user = User(id=uuid.uuid4())
+
+    async def create(self) -> uuid.UUID:
+        upload = await routers.create_upload(UploadCreate(filename="clip.mp4", content_type="video/mp4", size=SIZE),
+                                             user=self.user, db=self.db)
+        return upload.id
+
+    async def put(self, upload_id: uuid.UUID, number: int, body: bytes = None, checksum: str = None):
+        body = part(number) if body is None else body
+        await routers.put_part(make_request(body), upload_id, number, checksum or md5(body),
+                               user=self.user, db=self.db)
+
+    async def complete(self, upload_id: uuid.UUID):
+        return await routers.complete_upload(upload_id, user=self.user, db=self.db, red=self.red)
+
+
+def run(scenario):
+    async def main():
+        await s3_utils.open_s3_client()
+        try:
+            await s3_utils.s3_client.create_bucket(Bucket=BUCKET_NAME)
+        except s3_utils.s3_client.exceptions.BucketAlreadyOwnedByYou:
+            pass
+        engine = create_async_engine("sqlite+aiosqlite://")
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(UploadSession.__table__.create)
+            async with AsyncSession(engine, expire_on_commit=False) as db:
+                await scenario(Env(db))
+        finally:
+            await engine.dispose()
+            await s3_utils.close_s3_client()
+
+    asyncio.run(main())
+
+
+@pytest.fixture(autouse=True)
+def setup(s3_server, monkeypatch):
+    monkeypatch.setattr(routers, "save_video", saved_video)
+
+
+def test_create_upload():
+    async def scenario(env: Env):
+        upload_id = await env.create()
+        upload = await routers.get_upload(upload_id, user=env.user, db=env.db)
+        assert upload.parts == []
+        assert upload.part_size == S3_PART_SIZE
+
+    run(scenario)
+
+
+def test_out_of_order_parts_complete():
+    async def scenario(env: Env):
+        upload_id = await env.create()
+        for number in (3, 1, 2):
+            await env.put(upload_id, number)
+        assert (await routers.get_upload(upload_id, user=env.user, db=env.db)).parts == [1, 2, 3]
+
+        video = await env.complete(upload_id)
+
+        key = video["url"].rsplit("/", 1)[-1]
+        obj = await s3_utils.s3_client.get_object(Bucket=BUCKET_NAME, Key=f"videos/{key}")
+        assert await obj["Body"].read() == DATA
+        assert (await env.db.execute(select(UploadSession))).scalar() is None
+
+    run(scenario)
+
+
+def test_complete_with_missing_parts():
+    async def scenario(env: Env):
+        upload_id = await env.create()
+        await env.put(upload_id, 1)
+        await env.put(upload_id, 3)
+        with pytest.raises(HTTPException) as ex:
+            await env.complete(upload_id)
+        assert ex.value.status_code == 409
+        assert ex.value.detail["parts"] == [1, 3]
+
+    run(scenario)
+
+
+def test_checksum_mismatch():
+    async def scenario(env: Env):
+        upload_id = await env.create()
+        with pytest.raises(HTTPException) as ex:
+            await env.put(upload_id, 1, checksum=md5(b"something else"))
+        assert ex.value.status_code == 400
+        assert (await routers.get_upload(upload_id, user=env.user, db=env.db)).parts == []
+
+    run(scenario)
+
+
+def test_part_size_is_enforced():
+    async def scenario(env: Env):
+        upload_id = await env.create()
+        with pytest.raises(HTTPException) as ex:
+            await env.put(upload_id, 1, body=part(1)[:-1])
+        assert ex.value.status_code == 400
+
+        body = part(1)
+        with pytest.raises(HTTPException) as ex:
+            await routers.put_part(make_request(body, content_length=False), upload_id, 1, md5(body),
+                                   user=env.user, db=env.db)
+        assert ex.value.status_code == 411
+
+    run(scenario)
+
+
+def test_second_complete_finds_no_session():
+    async def scenario(env: Env):
+        upload_id = await env.create()
+        for number in (1, 2, 3):
+            await env.put(upload_id, number)
+        await env.complete(upload_id)
+        with pytest.raises(HTTPException) as ex:
+            await env.complete(upload_id)
+        assert ex.value.status_code == 404
+
+    run(scenario)
+
+
+def test_complete_retries_after_failed_insert(monkeypatch):
+    async def failing_save(url, name, user, db, red):
+        raise RuntimeError("insert failed")
+
+    async def scenario(env: Env):
+        upload_id = await env.create()
+        for number in (1, 2, 3):
+            await env.put(upload_id, number)
+        monkeypatch.setattr(routers, "save_video", failing_save)
+        with pytest.raises(RuntimeError):
+            await env.complete(upload_id)
+        await env.db.rollback()
+
+        monkeypatch.setattr(routers, "save_video", saved_video)
+        video = await env.complete(upload_id)
+        assert video["name"] == "clip.mp4"
+        assert (await env.db.execute(select(UploadSession))).scalar() is None
+
+    run(scenario)
+
+
+def test_expired_sessions_are_aborted():
+    async def scenario(env: Env):
+        upload_id = await env.create()
+        await env.put(upload_id, 1)
+        session = (await env.db.execute(select(UploadSession))).scalar()
+        session.created_date -= datetime.timedelta(seconds=UPLOAD_SESSION_TTL + 1)
+        await env.db.commit()
+
+        assert await expire_upload_sessions(env.db) == 1
+        assert (await env.db.execute(select(UploadSession))).scalar() is None
+        uploads = await s3_utils.s3_client.list_multipart_uploads(Bucket=BUCKET_NAME)
+        assert session.s3_upload_id not in [upload["UploadId"] for upload in uploads.get("Uploads", [])]
+
+    run(scenario)
+
+
+async def direct_put(env: Env, body: bytes) -> tuple[uuid.UUID, str]:
+    upload = await routers.create_direct_upload(UploadCreate(filename="clip.mp4", content_type="video/mp4",
+                                                             size=len(body)), user=env.user, red=env.red)
+    async with aiohttp.ClientSession() as http:
+        async with http.put(upload.url, data=body, headers=upload.headers) as res:
+            assert res.status == 200
+    return upload.id, upload.url
+
+
+def test_direct_upload_is_copied_out_of_the_presigned_key():
+    async def scenario(env: Env):
+        upload_id, url = await direct_put(env, DATA[:100])
+        video = await routers.complete_direct_upload(upload_id, user=env.user, db=env.db, red=env.red)
+        key = s3_utils.get_key_from_url(video["url"])
+        assert key.startswith("videos/")
+        assert await s3_utils.list_objects(STAGING_PREFIX) == []
+
+        # the presigned URL is still valid, but writing to it no longer touches the video
+        async with aiohttp.ClientSession() as http:
+            async with http.put(url, data=b"not a video", headers={"Content-Type": "video/mp4"}) as res:
+                assert res.status == 200
+        assert await s3_utils.download_object(key) == DATA[:100]
+
+    run(scenario)
+
+
+def test_expired_staging_objects_are_deleted(monkeypatch):
+    async def scenario(env: Env):
+        await direct_put(env, DATA[:100])
+        monkeypatch.setattr(upload_utils, "UPLOAD_SESSION_TTL", -60)
+        assert await upload_utils.expire_staging_objects() >= 1
+        assert await s3_utils.list_objects(STAGING_PREFIX) == []
+
+    run(scenario)